@@ -0,0 +1,18 @@
+-- =============================================================================
+-- Migration 065: Binary raw entity column for telemetry_events
+-- =============================================================================
+-- telemetry-worker now stores the raw NGSI-LD entity CBOR-encoded in raw_cbor
+-- instead of under payload->'raw'. payload keeps only the measurements
+-- projection (the only part timeseries-reader queries), so jsonb build cost
+-- and row size drop. Rows written before this migration keep payload->'raw'.
+-- Nullable without default: allowed on compressed hypertables.
+-- =============================================================================
+
+ALTER TABLE telemetry_events ADD COLUMN IF NOT EXISTS raw_cbor BYTEA;
+
+COMMENT ON COLUMN telemetry_events.raw_cbor IS
+    'CBOR-encoded raw NGSI-LD entity from the Orion-LD notification (telemetry-worker).';
+
+-- =============================================================================
+-- End of migration 065
+-- =============================================================================
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+One-off migration: drop device_profiles indexes superseded by the compound
+indexes that sdm-integration now creates on startup.
+
+Run once per environment against the sdm-integration MongoDB:
+    MONGODB_URL=mongodb://... python3 scripts/bootstrap/migrate-device-profile-indexes.py
+Safe to re-run; indexes that are already gone are skipped.
+"""
+
+import os
+import sys
+
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://mongodb-service:27017")
+
+# index name -> the index that covers it
+SUPERSEDED_INDEXES = {
+    "sdm_entity_type_1": "sdm_entity_type_1_tenant_id_1_is_public_1_name_1",
+    "tenant_id_1_is_public_1": "tenant_id_1_is_public_1_name_1",
+}
+
+
+def main() -> int:
+    client = MongoClient(MONGODB_URL, serverSelectionTimeoutMS=5000)
+    try:
+        profiles = client.nekazari.device_profiles
+        existing = profiles.index_information()
+        for name, replacement in SUPERSEDED_INDEXES.items():
+            if name not in existing:
+                print(f"ℹ️  {name} not present, skipping")
+                continue
+            if replacement not in existing:
+                # Never leave the collection without the covering index
+                print(f"⚠️  {replacement} missing, keeping {name} (start sdm-integration first)")
+                continue
+            try:
+                profiles.drop_index(name)
+                print(f"✅ Dropped {name} (covered by {replacement})")
+            except OperationFailure as e:
+                print(f"❌ Could not drop {name}: {e}")
+                return 1
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
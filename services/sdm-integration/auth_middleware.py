@@ -90,7 +90,7 @@ def log_entity_operation(operation, entity_id=None, entity_type=None, tenant=Non
     """Log entity operations for audit purposes"""
     tenant = tenant or getattr(g, 'tenant', 'unknown')
     user = user_id or getattr(g, 'user', 'unknown')
-    logger.info(f"[AUDIT] {operation} {entity_type or 'unknown'} {entity_id or 'N/A'} by {user} in tenant {tenant}")
+    logger.info("[AUDIT] %s %s %s by %s in tenant %s", operation, entity_type or 'unknown', entity_id or 'N/A', user, tenant)
 
 def require_entity_ownership(f):
     @wraps(f)
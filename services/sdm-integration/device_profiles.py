@@ -9,11 +9,16 @@ Supports multi-tenant profiles (global/private) with JEXL transformations.
 
 import os
 import re
+import time
+import json
+import atexit
 import logging
+import functools
 from datetime import datetime
-from flask import Blueprint, request, jsonify, g
+from typing import Optional
+from flask import Blueprint, Response, request, jsonify, g, stream_with_context
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 from pymongo.collection import Collection
 from auth_middleware import require_auth
 
@@ -24,51 +29,161 @@ device_profiles_bp = Blueprint("device_profiles", __name__, url_prefix="/sdm/pro
 
 # MongoDB connection (reuse from main app or create new)
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://mongodb-service:27017")
+MONGO_POOL_SIZE = int(os.getenv("MONGO_POOL", "50"))
 
 _mongo_client = None
 _profiles_collection = None
 
 
+def get_mongo_client() -> MongoClient:
+    """
+    Get the shared MongoDB client for this worker.
+    The client is created lazily so each gunicorn worker builds its own pool
+    after fork (sharing a MongoClient across a --preload fork is unsafe).
+    """
+    global _mongo_client
+    if _mongo_client is None:
+        _mongo_client = MongoClient(
+            MONGODB_URL,
+            maxPoolSize=MONGO_POOL_SIZE,
+            minPoolSize=5,
+            serverSelectionTimeoutMS=2000,
+            connectTimeoutMS=3000,
+            retryWrites=True,
+            appname="sdm-integration",
+        )
+    return _mongo_client
+
+
 def get_profiles_collection() -> Collection:
     """Get MongoDB collection for device profiles."""
-    global _mongo_client, _profiles_collection
+    global _profiles_collection
     if _profiles_collection is None:
-        _mongo_client = MongoClient(MONGODB_URL)
-        db = _mongo_client.nekazari
+        db = get_mongo_client().nekazari
         _profiles_collection = db.device_profiles
         # Create indexes
-        _profiles_collection.create_index([("tenant_id", 1), ("is_public", 1)])
-        _profiles_collection.create_index("sdm_entity_type")
+        _profiles_collection.create_index(
+            [("tenant_id", 1), ("is_public", 1), ("name", 1)]
+        )
+        _profiles_collection.create_index(
+            [("sdm_entity_type", 1), ("tenant_id", 1), ("is_public", 1), ("name", 1)]
+        )
     return _profiles_collection
 
 
+@atexit.register
+def _close_mongo_client():
+    """Close the MongoDB client on interpreter shutdown."""
+    if _mongo_client is not None:
+        _mongo_client.close()
+
+
+# Fields returned by the list endpoint (everything else stays on the server)
+PROFILE_LIST_PROJECTION = {
+    "name": 1,
+    "description": 1,
+    "sdm_entity_type": 1,
+    "is_public": 1,
+    "tenant_id": 1,
+    "mappings": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+
+def _iso(value):
+    """Render a stored timestamp as ISO 8601 (legacy documents hold strings)."""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+# Profile fields copied verbatim into API responses
+_LIST_KEYS = ("name", "description", "sdm_entity_type", "tenant_id")
+
+
+def _project(p: dict, include_mappings: bool = True) -> dict:
+    """Format a stored profile document for API responses."""
+    item = {k: p.get(k) for k in _LIST_KEYS}
+    item["id"] = str(p["_id"])
+    item["is_public"] = p.get("is_public", False)
+    item["created_at"] = _iso(p.get("created_at"))
+    item["updated_at"] = _iso(p.get("updated_at"))
+    if include_mappings:
+        item["mappings"] = p.get("mappings", [])
+    return item
+
+
+# Documents fetched per cursor batch while streaming the list endpoint
+LIST_BATCH_SIZE = 200
+
+
 # =============================================================================
-# JEXL Validation
+# IoT Agent Attribute Cache
 # =============================================================================
 
-# Allowed JEXL patterns (simple expressions only)
-JEXL_ALLOWED_PATTERNS = [
-    r"^val$",  # Just the value
-    r"^val\s*[\+\-\*\/]\s*[\d\.]+$",  # val +/-/*// number
-    r"^[\d\.]+\s*[\+\-\*\/]\s*val$",  # number +/-/*// val
-    r"^val\s*[\+\-\*\/]\s*[\d\.]+\s*[\+\-\*\/]\s*[\d\.]+$",  # val op num op num
-    r"^val\s*>\s*[\d\.]+\s*\?\s*[\d\.]+\s*:\s*val$",  # val > n ? n : val (clamp)
-    r"^val\s*<\s*[\d\.]+\s*\?\s*[\d\.]+\s*:\s*val$",  # val < n ? n : val (clamp)
-]
+# Seconds a worker may serve a cached profile; bounds staleness across workers
+PROFILE_CACHE_TTL = 60
 
 
-def validate_jexl_expression(expr: str) -> tuple[bool, str]:
+def get_profile_iot_attributes(profile_id: str) -> Optional[tuple[str, tuple]]:
     """
-    Validate a JEXL expression for safety.
-    Returns (is_valid, error_message).
+    Get (profile_name, iot_attributes) for a profile, or None when the
+    profile does not exist or has no mappings. The attribute entries are
+    finalized (expressions already rewritten) and shared between callers, so
+    they must be copied rather than mutated. Results are cached per worker;
+    PUT/DELETE on a profile clear this worker's cache and PROFILE_CACHE_TTL
+    limits how long other workers can serve an outdated entry.
     """
-    if not expr or expr.strip() == "":
-        return True, ""
+    return _load_profile_cached(profile_id, int(time.monotonic() // PROFILE_CACHE_TTL))
+
+
+@functools.lru_cache(maxsize=256)
+def _load_profile_cached(
+    profile_id: str, ttl_bucket: int
+) -> Optional[tuple[str, tuple]]:
+    """Load a profile and translate its mappings into IoT Agent attributes."""
+    profile = get_profiles_collection().find_one({"_id": ObjectId(profile_id)})
+    if not profile or not profile.get("mappings"):
+        return None
+
+    attributes = []
+    for mapping in profile.get("mappings", []):
+        attr = {
+            "object_id": mapping.get("incoming_key", ""),
+            "name": mapping.get("target_attribute"),
+            "type": mapping.get("type", "Number"),
+        }
+        # Add JEXL expression if transformation is defined
+        if mapping.get("transformation") and mapping["transformation"] != "val":
+            # IoT Agent uses 'expression' field for JEXL
+            attr["expression"] = mapping["transformation"].replace("val", "${@value}")
+        attributes.append(attr)
 
-    expr = expr.strip()
+    return profile.get("name"), tuple(attributes)
 
-    # Check for dangerous patterns
-    dangerous_patterns = [
+
+# =============================================================================
+# JEXL Validation
+# =============================================================================
+
+# Allowed JEXL shapes (simple expressions only), written as token-kind
+# signatures: v = val, n = number (digits and dots), o = + - * /
+JEXL_ALLOWED_SHAPES = frozenset(
+    {
+        "v",  # Just the value
+        "von",  # val +/-/*// number
+        "nov",  # number +/-/*// val
+        "vonon",  # val op num op num
+        "v>n?n:v",  # val > n ? n : val (clamp)
+        "v<n?n:v",  # val < n ? n : val (clamp)
+    }
+)
+
+_JEXL_ARITH_OPS = frozenset("+-*/")
+_JEXL_PUNCTUATION = frozenset("<>?:")
+
+# Dangerous substrings, matched case-insensitively in a single pass
+_DANGEROUS_TOKENS = frozenset(
+    [
         "import",
         "require",
         "eval",
@@ -79,14 +194,67 @@ def validate_jexl_expression(expr: str) -> tuple[bool, str]:
         "__",
         "constructor",
     ]
-    for pattern in dangerous_patterns:
-        if pattern in expr.lower():
-            return False, f"Expresión no permitida: contiene '{pattern}'"
+)
+_DANGEROUS_RE = re.compile(
+    "|".join(sorted(map(re.escape, _DANGEROUS_TOKENS))), re.IGNORECASE
+)
+
+
+def _jexl_shape(expr: str) -> str | None:
+    """
+    Tokenize an expression into its token-kind signature.
+    Returns None if it contains anything outside the allowed vocabulary.
+    """
+    kinds = []
+    i, n = 0, len(expr)
+    while i < n:
+        c = expr[i]
+        if c.isspace():
+            i += 1
+        elif c in _JEXL_ARITH_OPS:
+            kinds.append("o")
+            i += 1
+        elif c in _JEXL_PUNCTUATION:
+            kinds.append(c)
+            i += 1
+        elif c == "." or c.isdecimal():
+            while i < n and (expr[i] == "." or expr[i].isdecimal()):
+                i += 1
+            kinds.append("n")
+        elif expr.startswith("val", i):
+            kinds.append("v")
+            i += 3
+        else:
+            return None
+    return "".join(kinds)
+
 
-    # Check against allowed patterns
-    for pattern in JEXL_ALLOWED_PATTERNS:
-        if re.match(pattern, expr):
-            return True, ""
+# Number of distinct transformation strings whose validation result is memoized
+JEXL_VALIDATION_CACHE_SIZE = 512
+
+
+def validate_jexl_expression(expr: str) -> tuple[bool, str]:
+    """
+    Validate a JEXL expression for safety.
+    Returns (is_valid, error_message).
+    """
+    if not expr or expr.strip() == "":
+        return True, ""
+
+    return _validate_jexl_cached(expr.strip())
+
+
+@functools.lru_cache(maxsize=JEXL_VALIDATION_CACHE_SIZE)
+def _validate_jexl_cached(expr: str) -> tuple[bool, str]:
+    """Validate a stripped, non-empty JEXL expression (memoized)."""
+    # Check for dangerous patterns
+    match = _DANGEROUS_RE.search(expr)
+    if match:
+        return False, f"Expresión no permitida: contiene '{match.group(0).lower()}'"
+
+    # Check against allowed shapes
+    if _jexl_shape(expr) in JEXL_ALLOWED_SHAPES:
+        return True, ""
 
     return (
         False,
@@ -94,10 +262,12 @@ def validate_jexl_expression(expr: str) -> tuple[bool, str]:
     )
 
 
+MAPPING_REQUIRED_FIELDS = ("incoming_key", "target_attribute")
+
+
 def validate_mapping(mapping: dict, sdm_attributes: dict) -> tuple[bool, str]:
     """Validate a single mapping entry."""
-    required_fields = ["incoming_key", "target_attribute"]
-    for field in required_fields:
+    for field in MAPPING_REQUIRED_FIELDS:
         if field not in mapping:
             return False, f"Campo requerido: {field}"
 
@@ -119,6 +289,20 @@ def validate_mapping(mapping: dict, sdm_attributes: dict) -> tuple[bool, str]:
     return True, ""
 
 
+def _validate_mappings(
+    mappings: list, sdm_attributes: dict
+) -> tuple[Optional[int], str]:
+    """
+    Validate every mapping in one pass, stopping at the first failure.
+    Returns (index, error_message) for the failing entry, or (None, "").
+    """
+    for i, mapping in enumerate(mappings):
+        is_valid, error = validate_mapping(mapping, sdm_attributes)
+        if not is_valid:
+            return i, error
+    return None, ""
+
+
 # =============================================================================
 # CRUD Endpoints
 # =============================================================================
@@ -133,50 +317,65 @@ def list_profiles():
     Query params:
     - sdm_entity_type: filter by SDM type
     - include_global: include global profiles (default: true)
+    - include_mappings: include mapping arrays (default: true)
     """
     try:
         tenant_id = getattr(g, "tenant", None)
         sdm_type = request.args.get("sdm_entity_type")
         include_global = request.args.get("include_global", "true").lower() == "true"
+        include_mappings = (
+            request.args.get("include_mappings", "true").lower() == "true"
+        )
 
         collection = get_profiles_collection()
 
-        # Build query: global OR tenant-specific
-        query = {"$or": []}
+        # Build query: global OR tenant-specific ($or only when both apply)
+        branches = []
         if include_global:
-            query["$or"].append({"is_public": True})
+            branches.append({"is_public": True})
         if tenant_id:
-            query["$or"].append({"tenant_id": tenant_id})
+            branches.append({"tenant_id": tenant_id})
 
-        if not query["$or"]:
+        if len(branches) == 1:
+            query = dict(branches[0])
+        elif branches:
+            query = {"$or": branches}
+        else:
             query = {"is_public": True}  # Fallback
 
         if sdm_type:
             query["sdm_entity_type"] = sdm_type
 
-        profiles = list(collection.find(query).sort("name", 1))
-
-        # Convert ObjectId to string and format response
-        result = []
-        for p in profiles:
-            result.append(
-                {
-                    "id": str(p.get("_id")),
-                    "name": p.get("name"),
-                    "description": p.get("description"),
-                    "sdm_entity_type": p.get("sdm_entity_type"),
-                    "is_public": p.get("is_public", False),
-                    "tenant_id": p.get("tenant_id"),
-                    "mappings": p.get("mappings", []),
-                    "created_at": p.get("created_at"),
-                    "updated_at": p.get("updated_at"),
-                }
-            )
+        projection = dict(PROFILE_LIST_PROJECTION)
+        if not include_mappings:
+            del projection["mappings"]
 
-        return jsonify({"profiles": result, "count": len(result)}), 200
+        cursor = (
+            collection.find(query, projection=projection)
+            .sort("name", 1)
+            .batch_size(LIST_BATCH_SIZE)
+        )
+        # Pull the first document here so query errors still map to a 500
+        first = next(cursor, None)
+
+        def generate():
+            # Stream one document at a time; the count trails the array
+            yield '{"profiles":['
+            count = 0
+            if first is not None:
+                yield json.dumps(_project(first, include_mappings), default=str)
+                count = 1
+                for p in cursor:
+                    yield "," + json.dumps(_project(p, include_mappings), default=str)
+                    count += 1
+            yield f'],"count":{count}}}'
+
+        return Response(
+            stream_with_context(generate()), status=200, mimetype="application/json"
+        )
 
     except Exception as e:
-        logger.error(f"Error listing profiles: {e}", exc_info=True)
+        logger.error("Error listing profiles: %s", e, exc_info=True)
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
@@ -185,13 +384,12 @@ def list_profiles():
 def get_profile(profile_id: str):
     """Get a specific device profile."""
     try:
-        collection = get_profiles_collection()
-
-        try:
-            profile = collection.find_one({"_id": ObjectId(profile_id)})
-        except Exception:
+        if not ObjectId.is_valid(profile_id):
             return jsonify({"error": "ID de perfil inválido"}), 400
 
+        collection = get_profiles_collection()
+        profile = collection.find_one({"_id": ObjectId(profile_id)})
+
         if not profile:
             return jsonify({"error": "Perfil no encontrado"}), 404
 
@@ -200,25 +398,63 @@ def get_profile(profile_id: str):
         if not profile.get("is_public") and profile.get("tenant_id") != tenant_id:
             return jsonify({"error": "Acceso denegado"}), 403
 
-        return jsonify(
-            {
-                "id": str(profile.get("_id")),
-                "name": profile.get("name"),
-                "description": profile.get("description"),
-                "sdm_entity_type": profile.get("sdm_entity_type"),
-                "is_public": profile.get("is_public", False),
-                "tenant_id": profile.get("tenant_id"),
-                "mappings": profile.get("mappings", []),
-                "created_at": profile.get("created_at"),
-                "updated_at": profile.get("updated_at"),
-            }
-        ), 200
+        return jsonify(_project(profile)), 200
 
     except Exception as e:
-        logger.error(f"Error getting profile: {e}", exc_info=True)
+        logger.error("Error getting profile: %s", e, exc_info=True)
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
+def _build_profile_doc(
+    data: dict, tenant_id, user_roles, now: datetime
+) -> tuple[Optional[dict], str, int]:
+    """
+    Validate a create payload and build the profile document.
+    Returns (profile_doc, "", 0) or (None, error_message, http_status).
+    """
+    # Required fields
+    required = ["name", "sdm_entity_type", "mappings"]
+    for field in required:
+        if field not in data:
+            return None, f"Campo requerido: {field}", 400
+
+    # Validate SDM entity type
+    from sdm_api import get_sdm_entities
+
+    sdm_entities = get_sdm_entities()
+    sdm_type = data.get("sdm_entity_type")
+    if sdm_type not in sdm_entities:
+        return None, f"Tipo SDM no válido: {sdm_type}", 400
+
+    sdm_attributes = sdm_entities[sdm_type].get("attributes", {})
+
+    # Validate mappings
+    mappings = data.get("mappings", [])
+    if not isinstance(mappings, list):
+        return None, "mappings debe ser un array", 400
+
+    idx, error = _validate_mappings(mappings, sdm_attributes)
+    if idx is not None:
+        return None, f"Mapping {idx + 1}: {error}", 400
+
+    # Only PlatformAdmin can create public profiles
+    is_public = data.get("is_public", False)
+    if is_public and "PlatformAdmin" not in user_roles:
+        return None, "Solo PlatformAdmin puede crear perfiles públicos", 403
+
+    profile_doc = {
+        "name": data.get("name"),
+        "description": data.get("description", ""),
+        "sdm_entity_type": sdm_type,
+        "is_public": is_public,
+        "tenant_id": None if is_public else tenant_id,
+        "mappings": mappings,
+        "created_at": now,
+        "updated_at": now,
+    }
+    return profile_doc, "", 0
+
+
 @device_profiles_bp.route("", methods=["POST"])
 @require_auth
 def create_profile():
@@ -227,65 +463,25 @@ def create_profile():
     Body: {name, description, sdm_entity_type, mappings, is_public?}
     """
     try:
-        from sdm_api import get_sdm_entities
-
         data = request.get_json()
         if not data:
             return jsonify({"error": "No se recibieron datos"}), 400
 
-        # Required fields
-        required = ["name", "sdm_entity_type", "mappings"]
-        for field in required:
-            if field not in data:
-                return jsonify({"error": f"Campo requerido: {field}"}), 400
-
-        # Validate SDM entity type
-        sdm_entities = get_sdm_entities()
-        sdm_type = data.get("sdm_entity_type")
-        if sdm_type not in sdm_entities:
-            return jsonify({"error": f"Tipo SDM no válido: {sdm_type}"}), 400
-
-        sdm_attributes = sdm_entities[sdm_type].get("attributes", {})
-
-        # Validate mappings
-        mappings = data.get("mappings", [])
-        if not isinstance(mappings, list):
-            return jsonify({"error": "mappings debe ser un array"}), 400
-
-        for i, mapping in enumerate(mappings):
-            is_valid, error = validate_mapping(mapping, sdm_attributes)
-            if not is_valid:
-                return jsonify({"error": f"Mapping {i + 1}: {error}"}), 400
-
         # Determine tenant/public status
         tenant_id = getattr(g, "tenant", None)
         user_roles = getattr(g, "roles", [])
 
-        # Only PlatformAdmin can create public profiles
-        is_public = data.get("is_public", False)
-        if is_public and "PlatformAdmin" not in user_roles:
-            return jsonify(
-                {"error": "Solo PlatformAdmin puede crear perfiles públicos"}
-            ), 403
-
-        # Build profile document
-        now = datetime.utcnow().isoformat()
-        profile_doc = {
-            "name": data.get("name"),
-            "description": data.get("description", ""),
-            "sdm_entity_type": sdm_type,
-            "is_public": is_public,
-            "tenant_id": None if is_public else tenant_id,
-            "mappings": mappings,
-            "created_at": now,
-            "updated_at": now,
-        }
+        profile_doc, error, status = _build_profile_doc(
+            data, tenant_id, user_roles, datetime.utcnow()
+        )
+        if profile_doc is None:
+            return jsonify({"error": error}), status
 
         collection = get_profiles_collection()
         result = collection.insert_one(profile_doc)
 
         logger.info(
-            f"Created device profile: {data.get('name')} (id={result.inserted_id})"
+            "Created device profile: %s (id=%s)", data.get("name"), result.inserted_id
         )
 
         return jsonify(
@@ -293,39 +489,111 @@ def create_profile():
         ), 201
 
     except Exception as e:
-        logger.error(f"Error creating profile: {e}", exc_info=True)
+        logger.error("Error creating profile: %s", e, exc_info=True)
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+
+# Maximum number of profiles accepted by the batch create endpoint
+MAX_BATCH_PROFILES = 200
+
+
+@device_profiles_bp.route("/batch", methods=["POST"])
+@require_auth
+def create_profiles_batch():
+    """
+    Create several device profiles with a single bulk insert.
+    Body: {profiles: [{name, description, sdm_entity_type, mappings, is_public?}, ...]}
+    Response 201: {created, errors: [], ids: [...]}
+
+    Every profile is validated before anything is written; a single invalid
+    entry rejects the whole batch. A write failure is a 500 for the batch.
+    """
+    try:
+        data = request.get_json()
+        if not data or "profiles" not in data:
+            return jsonify(
+                {"error": "El cuerpo debe contener un array 'profiles'"}
+            ), 400
+
+        items = data["profiles"]
+        if not isinstance(items, list) or len(items) == 0:
+            return jsonify({"error": "'profiles' debe ser un array no vacío"}), 400
+
+        if len(items) > MAX_BATCH_PROFILES:
+            return jsonify(
+                {"error": f"Máximo {MAX_BATCH_PROFILES} perfiles por petición"}
+            ), 400
+
+        tenant_id = getattr(g, "tenant", None)
+        user_roles = getattr(g, "roles", [])
+        now = datetime.utcnow()
+
+        docs = []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                return jsonify({"error": f"Perfil {i + 1}: formato no válido"}), 400
+            profile_doc, error, status = _build_profile_doc(
+                item, tenant_id, user_roles, now
+            )
+            if profile_doc is None:
+                return jsonify({"error": f"Perfil {i + 1}: {error}"}), status
+            docs.append(profile_doc)
+
+        # insert_many assigns each document its _id before sending
+        get_profiles_collection().insert_many(docs)
+        ids = [str(doc["_id"]) for doc in docs]
+
+        logger.info("Batch created %d device profiles", len(ids))
+
+        return jsonify({"created": len(ids), "errors": [], "ids": ids}), 201
+
+    except Exception as e:
+        logger.error("Error batch creating profiles: %s", e, exc_info=True)
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
+def _writable_profile_filter(oid: ObjectId, tenant_id, user_roles) -> dict:
+    """
+    Build a filter matching the profile only if the caller may modify it.
+    Public profiles require PlatformAdmin; private ones must belong to the tenant.
+    """
+    own_private = {"is_public": {"$ne": True}, "tenant_id": tenant_id}
+    if "PlatformAdmin" in user_roles:
+        return {"_id": oid, "$or": [{"is_public": True}, own_private]}
+    return {"_id": oid, **own_private}
+
+
+def _write_miss_response(collection: Collection, oid: ObjectId, public_error: str):
+    """Explain why an access-filtered write matched nothing (404 or 403)."""
+    profile = collection.find_one({"_id": oid}, projection={"is_public": 1})
+    if not profile:
+        return jsonify({"error": "Perfil no encontrado"}), 404
+    if profile.get("is_public"):
+        return jsonify({"error": public_error}), 403
+    return jsonify({"error": "Acceso denegado"}), 403
+
+
 @device_profiles_bp.route("/<profile_id>", methods=["PUT"])
 @require_auth
 def update_profile(profile_id: str):
     """Update an existing device profile."""
     try:
-        from sdm_api import get_sdm_entities
-
-        collection = get_profiles_collection()
-
-        try:
-            profile = collection.find_one({"_id": ObjectId(profile_id)})
-        except Exception:
+        if not ObjectId.is_valid(profile_id):
             return jsonify({"error": "ID de perfil inválido"}), 400
 
-        if not profile:
-            return jsonify({"error": "Perfil no encontrado"}), 404
+        collection = get_profiles_collection()
+        oid = ObjectId(profile_id)
 
-        # Check ownership
         tenant_id = getattr(g, "tenant", None)
         user_roles = getattr(g, "roles", [])
+        access_filter = _writable_profile_filter(oid, tenant_id, user_roles)
+        public_error = "Solo PlatformAdmin puede editar perfiles públicos"
 
-        if profile.get("is_public"):
-            if "PlatformAdmin" not in user_roles:
-                return jsonify(
-                    {"error": "Solo PlatformAdmin puede editar perfiles públicos"}
-                ), 403
-        else:
-            if profile.get("tenant_id") != tenant_id:
-                return jsonify({"error": "Acceso denegado"}), 403
+        # Existence and access first, so a missing or foreign profile is
+        # reported as 404/403 before the body is validated
+        profile = collection.find_one(access_filter, projection={"sdm_entity_type": 1})
+        if not profile:
+            return _write_miss_response(collection, oid, public_error)
 
         data = request.get_json()
         if not data:
@@ -333,21 +601,22 @@ def update_profile(profile_id: str):
 
         # Validate SDM type and mappings if provided
         sdm_type = data.get("sdm_entity_type", profile.get("sdm_entity_type"))
-        sdm_entities = get_sdm_entities()
 
+        from sdm_api import get_sdm_entities
+
+        sdm_entities = get_sdm_entities()
         if sdm_type not in sdm_entities:
             return jsonify({"error": f"Tipo SDM no válido: {sdm_type}"}), 400
 
         sdm_attributes = sdm_entities[sdm_type].get("attributes", {})
 
         if "mappings" in data:
-            for i, mapping in enumerate(data["mappings"]):
-                is_valid, error = validate_mapping(mapping, sdm_attributes)
-                if not is_valid:
-                    return jsonify({"error": f"Mapping {i + 1}: {error}"}), 400
+            idx, error = _validate_mappings(data["mappings"], sdm_attributes)
+            if idx is not None:
+                return jsonify({"error": f"Mapping {idx + 1}: {error}"}), 400
 
         # Build update
-        update_doc = {"$set": {"updated_at": datetime.utcnow().isoformat()}}
+        update_doc = {"$set": {"updated_at": datetime.utcnow()}}
 
         allowed_fields = ["name", "description", "sdm_entity_type", "mappings"]
         for field in allowed_fields:
@@ -360,14 +629,23 @@ def update_profile(profile_id: str):
             if data["is_public"]:
                 update_doc["$set"]["tenant_id"] = None
 
-        collection.update_one({"_id": ObjectId(profile_id)}, update_doc)
+        # Same access filter on the write, in case the profile changed meanwhile
+        updated = collection.find_one_and_update(
+            access_filter,
+            update_doc,
+            projection={"_id": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not updated:
+            return _write_miss_response(collection, oid, public_error)
 
-        logger.info(f"Updated device profile: {profile_id}")
+        _load_profile_cached.cache_clear()
+        logger.info("Updated device profile: %s", profile_id)
 
         return jsonify({"message": "Perfil actualizado correctamente"}), 200
 
     except Exception as e:
-        logger.error(f"Error updating profile: {e}", exc_info=True)
+        logger.error("Error updating profile: %s", e, exc_info=True)
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
@@ -376,37 +654,32 @@ def update_profile(profile_id: str):
 def delete_profile(profile_id: str):
     """Delete a device profile."""
     try:
-        collection = get_profiles_collection()
-
-        try:
-            profile = collection.find_one({"_id": ObjectId(profile_id)})
-        except Exception:
+        if not ObjectId.is_valid(profile_id):
             return jsonify({"error": "ID de perfil inválido"}), 400
 
-        if not profile:
-            return jsonify({"error": "Perfil no encontrado"}), 404
+        collection = get_profiles_collection()
+        oid = ObjectId(profile_id)
 
-        # Check ownership
         tenant_id = getattr(g, "tenant", None)
         user_roles = getattr(g, "roles", [])
 
-        if profile.get("is_public"):
-            if "PlatformAdmin" not in user_roles:
-                return jsonify(
-                    {"error": "Solo PlatformAdmin puede eliminar perfiles públicos"}
-                ), 403
-        else:
-            if profile.get("tenant_id") != tenant_id:
-                return jsonify({"error": "Acceso denegado"}), 403
-
-        collection.delete_one({"_id": ObjectId(profile_id)})
+        # Access check and delete in a single round trip
+        deleted = collection.find_one_and_delete(
+            _writable_profile_filter(oid, tenant_id, user_roles),
+            projection={"_id": 1},
+        )
+        if not deleted:
+            return _write_miss_response(
+                collection, oid, "Solo PlatformAdmin puede eliminar perfiles públicos"
+            )
 
-        logger.info(f"Deleted device profile: {profile_id}")
+        _load_profile_cached.cache_clear()
+        logger.info("Deleted device profile: %s", profile_id)
 
         return jsonify({"message": "Perfil eliminado correctamente"}), 200
 
     except Exception as e:
-        logger.error(f"Error deleting profile: {e}", exc_info=True)
+        logger.error("Error deleting profile: %s", e, exc_info=True)
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
@@ -453,7 +726,7 @@ def get_schema_attributes(entity_type: str):
         ), 200
 
     except Exception as e:
-        logger.error(f"Error getting schema attributes: {e}", exc_info=True)
+        logger.error("Error getting schema attributes: %s", e, exc_info=True)
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
@@ -479,5 +752,5 @@ def list_schemas():
         return jsonify({"schemas": result, "count": len(result)}), 200
 
     except Exception as e:
-        logger.error(f"Error listing schemas: {e}", exc_info=True)
+        logger.error("Error listing schemas: %s", e, exc_info=True)
         return jsonify({"error": "Error interno del servidor"}), 500
@@ -5,38 +5,59 @@
 
 import os
 import sys
-import json
 import logging
+import queue
+import atexit
 import secrets
 import hashlib
-import uuid
-from flask import Flask, request, jsonify, g
+import time
+import orjson
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+from types import MappingProxyType
+from logging.handlers import QueueHandler, QueueListener
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
-import pymongo
-from pymongo import MongoClient
+from bson import ObjectId
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
 
 # Add common directory to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'common'))
 from auth_middleware import require_auth, inject_fiware_headers, log_entity_operation, require_entity_ownership
 from entity_utils import generate_entity_id
 
-# Configure logging to stdout for kubernetes
+# Configure logging to stdout for kubernetes. Request threads only enqueue
+# records; a listener thread formats and writes them (audit lines included)
+_log_queue = queue.SimpleQueue()
+_log_stdout_handler = logging.StreamHandler(sys.stdout)
+_log_stdout_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_log_listener = QueueListener(_log_queue, _log_stdout_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logging.basicConfig(
     level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
+    format='%(message)s',  # full line format is applied by the listener's handler
+    handlers=[QueueHandler(_log_queue)]
 )
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
 app = Flask(__name__)
 _cors_origins = [o.strip() for o in os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(',') if o.strip()]
-CORS(app, origins=_cors_origins, supports_credentials=True)
+# Browser clients only call /sdm/*; /health and /version skip the CORS hooks
+CORS(app, resources={r'/sdm/*': {'origins': _cors_origins}}, supports_credentials=True)
 
 # Register Device Profiles blueprint
-from device_profiles import device_profiles_bp
+from device_profiles import device_profiles_bp, get_profile_iot_attributes
 app.register_blueprint(device_profiles_bp)
 
 # Configuration - All environment variables are REQUIRED for security
@@ -55,36 +76,95 @@ IOT_AGENT_URL = os.getenv('IOT_AGENT_URL', 'http://iot-agent-json-service:4041')
 MQTT_HOST = os.getenv('MQTT_EXTERNAL_HOST', '')  # External hostname for devices — must be set via env
 MQTT_PORT = int(os.getenv('MQTT_EXTERNAL_PORT', '8883'))  # External TLS port
 MQTT_INTERNAL_HOST = os.getenv('MQTT_HOST', 'mosquitto-service')
+MQTT_PROTOCOL = 'mqtts' if MQTT_PORT == 8883 else 'mqtt'
+
+# Sample payload returned with MQTT credentials (constant, shared by all responses)
+_MQTT_EXAMPLE_PAYLOAD = {
+    'temperature': 22.5,
+    'humidity': 65,
+    'batteryLevel': 85
+}
 
 # Types that require IoT provisioning
-IOT_ENTITY_TYPES = {'AgriSensor', 'Sensor', 'Actuator', 'WeatherStation', 'AgriculturalTractor', 'LivestockAnimal', 'AgriculturalMachine'}
+IOT_ENTITY_TYPES = frozenset({'AgriSensor', 'Sensor', 'Actuator', 'WeatherStation', 'AgriculturalTractor', 'LivestockAnimal', 'AgriculturalMachine'})
 
 # SOTA: Use local unified context from API Gateway
 CONTEXT_URL = os.getenv('CONTEXT_URL', 'http://api-gateway-service:5000/ngsi-ld-context.json')
 PLATFORM_API_URL = os.getenv("PLATFORM_API_URL", "http://api-gateway-service:5000").rstrip("/")
 SOTA_CONTEXT = CONTEXT_URL
 
+# Opening of every created entity's JSON body up to and including the
+# @context member; the remaining members are spliced in after it
+_ENTITY_CONTEXT_PREFIX = b'{"@context":' + orjson.dumps(SOTA_CONTEXT) + b','
+
 # Tenant Limits
 MAX_SENSORS_PER_TENANT = int(os.getenv('MAX_SENSORS_PER_TENANT', '100'))
 MAX_ROBOTS_PER_TENANT = int(os.getenv('MAX_ROBOTS_PER_TENANT', '5'))
 
+# Entity type -> per-tenant limit (types not listed are unlimited)
+_ENTITY_LIMIT_MAP = {
+    **{t: MAX_SENSORS_PER_TENANT for t in ('AgriSensor', 'Sensor', 'Device', 'WeatherStation', 'LivestockAnimal')},
+    **{t: MAX_ROBOTS_PER_TENANT for t in ('AgriculturalRobot', 'AgriculturalTractor', 'AgriculturalMachine')},
+}
+
+# Per-worker entity counts {(tenant_id, entity_type): (count, refreshed_at)}.
+# Seeded from Orion-LD, bumped on local creates and resynced after the TTL;
+# a cached count only ever short-circuits the "below limit" answer.
+TENANT_COUNT_TTL = 30
+_tenant_counts: dict[tuple[str, str], tuple[int, float]] = {}
+_tenant_counts_lock = threading.Lock()
+
+# Read-through Redis cache for single-entity GETs (disabled when REDIS_URL is
+# unset or ENTITY_CACHE_TTL is 0). Telemetry updates reach Orion-LD without
+# passing through this service, so the TTL is deliberately short.
+REDIS_URL = os.getenv('REDIS_URL')
+REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', os.getenv('REDIS_PASS'))
+ENTITY_CACHE_TTL = int(os.getenv('ENTITY_CACHE_TTL', '5'))
+ENTITY_CACHE_RETRY_SECONDS = 60
+_entity_cache = None
+_entity_cache_retry_at = 0.0
+
 
 # Set logging level
 logging.getLogger().setLevel(getattr(logging, LOG_LEVEL))
 
+# Shared HTTP session for Orion-LD and IoT Agent calls (keep-alive + pooling).
+# Only idempotent methods are retried, and only on gateway errors.
+# HTTP_POOL_MAXSIZE is the number of keep-alive connections kept per host; with
+# gevent workers, requests beyond it open short-lived connections.
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '64'))
+_http_session = requests.Session()
+_http_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.1,
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False  # Hand the last response back to the caller
+    )
+)
+_http_session.mount('http://', _http_adapter)
+_http_session.mount('https://', _http_adapter)
+
+# Background pool for IoT Agent calls that can overlap with Orion-LD work
+_PROVISION_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv('IOT_PROVISION_WORKERS', '16')),
+    thread_name_prefix='iot-provision'
+)
+
 def get_mongodb_connection():
-    """Get MongoDB connection"""
-    try:
-        client = MongoClient(MONGODB_URL)
-        return client
-    except Exception as e:
-        logger.error(f"MongoDB connection error: {e}")
-        return None
+    """Get the shared, pooled MongoDB client (one per worker process)"""
+    from device_profiles import get_mongo_client
+    return get_mongo_client()
+
+
+_TENANT_APIKEY_PREFIX = 'nkz_iot_'
 
 
 def _generate_tenant_apikey() -> str:
     """Generate a random API key for a tenant service group."""
-    return f"nkz_iot_{secrets.token_hex(16)}"
+    return _TENANT_APIKEY_PREFIX + secrets.token_hex(16)
 
 
 def get_or_create_service_group(tenant_id: str) -> str | None:
@@ -107,17 +187,17 @@ def get_or_create_service_group(tenant_id: str) -> str | None:
 
     try:
         # Check if a service group already exists for this tenant
-        resp = requests.get(
+        resp = _http_session.get(
             f'{IOT_AGENT_URL}/iot/services',
             headers=headers,
             timeout=5
         )
         if resp.status_code == 200:
-            data = resp.json()
+            data = orjson.loads(resp.content)
             services = data.get('services', [])
             if services:
                 existing_apikey = services[0].get('apikey')
-                logger.debug(f"Service group exists for tenant '{tenant_id}', apikey={existing_apikey[:20]}...")
+                logger.debug("Service group exists for tenant '%s', apikey=%s...", tenant_id, existing_apikey[:20])
                 return existing_apikey
 
         # Create a new service group with a tenant-level apikey
@@ -135,7 +215,7 @@ def get_or_create_service_group(tenant_id: str) -> str | None:
             }]
         }
 
-        resp = requests.post(
+        resp = _http_session.post(
             f'{IOT_AGENT_URL}/iot/services',
             json=service_group,
             headers=headers,
@@ -147,9 +227,9 @@ def get_or_create_service_group(tenant_id: str) -> str | None:
             return tenant_apikey
         elif resp.status_code == 409:
             # Race condition: another request created it first — retrieve it
-            resp2 = requests.get(f'{IOT_AGENT_URL}/iot/services', headers=headers, timeout=5)
+            resp2 = _http_session.get(f'{IOT_AGENT_URL}/iot/services', headers=headers, timeout=5)
             if resp2.status_code == 200:
-                services = resp2.json().get('services', [])
+                services = orjson.loads(resp2.content).get('services', [])
                 if services:
                     return services[0].get('apikey')
             logger.warning(f"Service group 409 but cannot retrieve for tenant '{tenant_id}'")
@@ -164,6 +244,32 @@ def get_or_create_service_group(tenant_id: str) -> str | None:
         return None
 
 
+# Fields shared by every IoT Agent device entry; the lists are only
+# serialized, never mutated, so sharing them across entries is safe
+_DEVICE_TEMPLATE = {
+    'protocol': 'IoTA-JSON',
+    'transport': 'MQTT',
+    'lazy': [],
+    'commands': []
+}
+
+
+def _build_device_config(device_id: str, entity_id: str, entity_type: str, api_key: str,
+                         attributes: list, location: dict = None) -> dict:
+    """Build one IoT Agent device registration entry"""
+    # Location is registered as a static attribute when provided
+    static_attrs = [{'name': 'location', 'type': 'GeoProperty', 'value': location}] if location else []
+    return {
+        **_DEVICE_TEMPLATE,
+        'device_id': device_id,
+        'entity_name': entity_id,
+        'entity_type': entity_type,
+        'apikey': api_key,
+        'attributes': attributes,
+        'static_attributes': static_attrs
+    }
+
+
 def provision_iot_device(entity_id: str, entity_type: str, tenant_id: str,
                          device_name: str, location: dict = None,
                          profile_id: str = None) -> dict:
@@ -201,27 +307,12 @@ def provision_iot_device(entity_id: str, entity_type: str, tenant_id: str,
         # Try to load attributes from DeviceProfile if profile_id is provided
         if profile_id:
             try:
-                from device_profiles import get_profiles_collection
-                from bson import ObjectId
-                
-                collection = get_profiles_collection()
-                profile = collection.find_one({'_id': ObjectId(profile_id)})
-                
-                if profile and profile.get('mappings'):
-                    result['profile_used'] = profile.get('name')
-                    for mapping in profile.get('mappings', []):
-                        attr = {
-                            'object_id': mapping.get('incoming_key', ''),
-                            'name': mapping.get('target_attribute'),
-                            'type': mapping.get('type', 'Number')
-                        }
-                        # Add JEXL expression if transformation is defined
-                        if mapping.get('transformation') and mapping['transformation'] != 'val':
-                            # IoT Agent uses 'expression' field for JEXL
-                            expr = mapping['transformation'].replace('val', '${@value}')
-                            attr['expression'] = expr
-                        attributes.append(attr)
-                    logger.info(f"Loaded {len(attributes)} attributes from profile '{profile.get('name')}'")
+                cached = get_profile_iot_attributes(profile_id)
+                if cached:
+                    profile_name, profile_attributes = cached
+                    result['profile_used'] = profile_name
+                    attributes = list(profile_attributes)
+                    logger.info(f"Loaded {len(attributes)} attributes from profile '{profile_name}'")
             except Exception as e:
                 logger.warning(f"Failed to load profile {profile_id}: {e}, using defaults")
         
@@ -231,28 +322,9 @@ def provision_iot_device(entity_id: str, entity_type: str, tenant_id: str,
             return result
         
         device_config = {
-            'devices': [{
-                'device_id': device_id,
-                'entity_name': entity_id,
-                'entity_type': entity_type,
-                'protocol': 'IoTA-JSON',
-                'transport': 'MQTT',
-                'apikey': api_key,
-                'attributes': attributes,
-                'lazy': [],
-                'commands': [],
-                'static_attributes': []
-            }]
+            'devices': [_build_device_config(device_id, entity_id, entity_type, api_key, attributes, location)]
         }
         
-        # Add location as static attribute if provided
-        if location:
-            device_config['devices'][0]['static_attributes'].append({
-                'name': 'location',
-                'type': 'GeoProperty',
-                'value': location
-            })
-        
         # Register device in IoT Agent
         iot_headers = {
             'Content-Type': 'application/json',
@@ -261,9 +333,10 @@ def provision_iot_device(entity_id: str, entity_type: str, tenant_id: str,
         }
         
         logger.info(f"Provisioning device {device_id} in IoT Agent...")
-        logger.debug(f"Device config: {json.dumps(device_config, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Device config: %s", orjson.dumps(device_config, option=orjson.OPT_INDENT_2).decode())
         
-        iot_response = requests.post(
+        iot_response = _http_session.post(
             f'{IOT_AGENT_URL}/iot/devices',
             json=device_config,
             headers=iot_headers,
@@ -276,7 +349,7 @@ def provision_iot_device(entity_id: str, entity_type: str, tenant_id: str,
             result['mqtt'] = {
                 'host': MQTT_HOST,
                 'port': MQTT_PORT,
-                'protocol': 'mqtts' if MQTT_PORT == 8883 else 'mqtt',
+                'protocol': MQTT_PROTOCOL,
                 'api_key': api_key,
                 'device_id': device_id,
                 'topics': {
@@ -284,11 +357,7 @@ def provision_iot_device(entity_id: str, entity_type: str, tenant_id: str,
                     'publish_data_json': f'/json/{api_key}/{device_id}/attrs',
                     'commands': f'/{api_key}/{device_id}/cmd'
                 },
-                'example_payload': {
-                    'temperature': 22.5,
-                    'humidity': 65,
-                    'batteryLevel': 85
-                },
+                'example_payload': _MQTT_EXAMPLE_PAYLOAD,
                 'warning': '⚠️ GUARDA ESTA INFORMACIÓN. La API Key no se puede recuperar después.'
             }
             logger.info(f"Successfully provisioned device {device_id}")
@@ -308,17 +377,138 @@ def provision_iot_device(entity_id: str, entity_type: str, tenant_id: str,
     
     return result
 
+def provision_iot_devices_bulk(specs: list, tenant_id: str) -> dict:
+    """
+    Register several IoT devices of one tenant with a single IoT Agent POST.
+
+    Each spec is a dict with entity_id, entity_type, profile_id and optional
+    location. Specs whose profile has no mappings are reported in 'errors'
+    and left out of the request.
+    """
+    result = {
+        'provisioned': False,
+        'api_key': None,
+        'device_ids': [],
+        'errors': [],
+        'error': None
+    }
+
+    try:
+        api_key = get_or_create_service_group(tenant_id)
+        if not api_key:
+            result['error'] = "Failed to get/create IoT Agent service group for tenant"
+            return result
+
+        devices = []
+        for spec in specs:
+            entity_id = spec['entity_id']
+            device_id = entity_id.split(':')[-1] if ':' in entity_id else entity_id
+            profile_id = spec.get('profile_id')
+            if profile_id and not ObjectId.is_valid(profile_id):
+                # One malformed id must not abort provisioning for the whole batch
+                result['errors'].append({'entity_id': entity_id, 'error': f'Invalid DeviceProfile id: {profile_id}'})
+                continue
+            profile = get_profile_iot_attributes(profile_id) if profile_id else None
+            if not profile:
+                result['errors'].append({'entity_id': entity_id, 'error': 'No valid DeviceProfile with attribute mappings'})
+                continue
+            devices.append(_build_device_config(
+                device_id, entity_id, spec['entity_type'], api_key, list(profile[1]), spec.get('location')
+            ))
+
+        if not devices:
+            result['error'] = "No devices to provision"
+            return result
+
+        iot_headers = {
+            'Content-Type': 'application/json',
+            'Fiware-Service': tenant_id,
+            'Fiware-ServicePath': '/'
+        }
+
+        logger.info(f"Provisioning {len(devices)} devices in IoT Agent (single request)...")
+
+        iot_response = _http_session.post(
+            f'{IOT_AGENT_URL}/iot/devices',
+            json={'devices': devices},
+            headers=iot_headers,
+            timeout=30
+        )
+
+        if iot_response.status_code in [200, 201]:
+            result['provisioned'] = True
+            result['api_key'] = api_key
+            result['device_ids'] = [d['device_id'] for d in devices]
+        else:
+            result['error'] = f"IoT Agent error: {iot_response.status_code} - {iot_response.text[:200]}"
+            logger.warning(f"Failed to bulk provision devices: {result['error']}")
+
+    except requests.exceptions.Timeout:
+        result['error'] = "IoT Agent timeout - devices not provisioned"
+        logger.error(result['error'])
+    except requests.exceptions.ConnectionError:
+        result['error'] = "Cannot connect to IoT Agent - devices not provisioned"
+        logger.error(result['error'])
+    except Exception as e:
+        result['error'] = f"Provisioning error: {str(e)}"
+        logger.error(result['error'], exc_info=True)
+
+    return result
+
+@lru_cache(maxsize=1024)
+def _fiware_headers_for(tenant_id: str) -> MappingProxyType:
+    """Read-only FIWARE tenant headers, built once per tenant; spread into a new dict per request"""
+    return MappingProxyType(inject_fiware_headers({}, tenant_id))
+
+def _get_entity_cache():
+    """Redis client for the entity cache, or None when disabled or unreachable"""
+    global _entity_cache, _entity_cache_retry_at
+    if _entity_cache is not None or not (REDIS_AVAILABLE and REDIS_URL and ENTITY_CACHE_TTL > 0):
+        return _entity_cache
+    now = time.monotonic()
+    if now < _entity_cache_retry_at:
+        return None
+    try:
+        client = redis.from_url(REDIS_URL, password=REDIS_PASSWORD or None,
+                                socket_connect_timeout=1, socket_timeout=1)
+        client.ping()
+        _entity_cache = client
+    except Exception as e:
+        # Serve straight from Orion-LD and retry the connection later
+        _entity_cache_retry_at = now + ENTITY_CACHE_RETRY_SECONDS
+        logger.warning("Entity cache unavailable, retrying in %ss: %s", ENTITY_CACHE_RETRY_SECONDS, e)
+    return _entity_cache
+
+def _entity_cache_key(tenant_id: str, entity_id: str) -> str:
+    return f'sdm:entity:{tenant_id}:{entity_id}'
+
+def _invalidate_cached_entity(tenant_id: str, entity_id: str):
+    """Drop a cached entity body after it was changed through this service"""
+    cache = _get_entity_cache()
+    if cache is None:
+        return
+    try:
+        cache.delete(_entity_cache_key(tenant_id, entity_id))
+    except Exception as e:
+        logger.warning("Failed to invalidate cached entity %s: %s", entity_id, e)
+
+@lru_cache(maxsize=2048)
+def _orion_ld_headers(tenant_id: str, header: str) -> MappingProxyType:
+    """Read-only tenant headers plus an ld+json 'Accept' or 'Content-Type' header"""
+    return MappingProxyType({header: 'application/ld+json', **_fiware_headers_for(tenant_id)})
+
 def _check_tenant_limits(tenant_id: str, entity_type: str) -> bool:
     """Check if tenant has reached the limit for the given entity type"""
-    limit = 0
-    if entity_type in ['AgriSensor', 'Sensor', 'Device', 'WeatherStation', 'LivestockAnimal']:
-        limit = MAX_SENSORS_PER_TENANT
-    elif entity_type in ['AgriculturalRobot', 'AgriculturalTractor', 'AgriculturalMachine']:
-        limit = MAX_ROBOTS_PER_TENANT
-    else:
+    limit = _ENTITY_LIMIT_MAP.get(entity_type)
+    if limit is None:
         # No specific limit for other types
         return True
     
+    key = (tenant_id, entity_type)
+    cached = _tenant_counts.get(key)
+    if cached and cached[0] < limit and time.monotonic() - cached[1] < TENANT_COUNT_TTL:
+        return True
+
     try:
         # Query Orion-LD count
         orion_url = f"{ORION_URL}/ngsi-ld/v1/entities"
@@ -327,18 +517,22 @@ def _check_tenant_limits(tenant_id: str, entity_type: str) -> bool:
             'options': 'count',
             'limit': 1  # We only need the count header
         }
-        headers = inject_fiware_headers({}, tenant_id)
+        headers = _fiware_headers_for(tenant_id)
         
-        response = requests.get(orion_url, params=params, headers=headers, timeout=5)
+        response = _http_session.get(orion_url, params=params, headers=headers, timeout=5)
         
         if response.status_code == 200:
             count = int(response.headers.get('NGSILD-Results-Count', 0))
+            with _tenant_counts_lock:
+                _tenant_counts[key] = (count, time.monotonic())
             if count >= limit:
                 logger.warning(f"Tenant {tenant_id} reached limit for {entity_type}: {count}/{limit}")
                 return False
             return True
         elif response.status_code == 404:
             # First entity of this type
+            with _tenant_counts_lock:
+                _tenant_counts[key] = (0, time.monotonic())
             return True
         else:
             logger.warning(f"Failed to check limits: {response.status_code}")
@@ -348,289 +542,341 @@ def _check_tenant_limits(tenant_id: str, entity_type: str) -> bool:
         logger.error(f"Error checking tenant limits: {e}")
         return True
 
-def get_sdm_entities():
-    """Get available SDM entities"""
-    return {
-        "AgriculturalRobot": {
-            "description": "A robot used in agricultural operations",
-            "attributes": {
-                "name": {"type": "Text", "description": "Robot name"},
-                "status": {"type": "Text", "description": "Current status"},
-                "location": {"type": "geo:json", "description": "Robot location"},
-                "batteryLevel": {"type": "Number", "description": "Battery level percentage"},
-                "currentTask": {"type": "Text", "description": "Current task being performed"}
-            }
-        },
-        "AgriSensor": {
-            "description": "Agricultural sensor device (SAREF4AGRI)",
-            "attributes": {
-                "name": {"type": "Text", "description": "Sensor name"},
-                "description": {"type": "Text", "description": "Sensor description"},
-                "location": {"type": "geo:json", "description": "Sensor location"},
-                "sensorType": {"type": "Text", "description": "Type of sensor"},
-                "controlledProperty": {"type": "List", "description": "Properties measured by this sensor"},
-                "refDeviceProfile": {"type": "Relationship", "description": "Link to DeviceProfile"},
-                # Meteorological / environmental measurements
-                "airTemperature": {"type": "Number", "description": "Air temperature (CEL)"},
-                "relativeHumidity": {"type": "Number", "description": "Relative humidity (P1)"},
-                "atmosphericPressure": {"type": "Number", "description": "Atmospheric pressure (HPA)"},
-                "solarRadiation": {"type": "Number", "description": "Solar radiation (WM2)"},
-                "windSpeed": {"type": "Number", "description": "Wind speed (MTS)"},
-                "windDirection": {"type": "Number", "description": "Wind direction (DD)"},
-                "precipitation": {"type": "Number", "description": "Precipitation (MMT)"},
-                # Soil measurements
-                "soilMoisture": {"type": "Number", "description": "Soil volumetric water content (P1)"},
-                "soilTemperature": {"type": "Number", "description": "Soil temperature (CEL)"},
-                "soilConductivity": {"type": "Number", "description": "Soil electrical conductivity"},
-                # Plant measurements
-                "leafTemperature": {"type": "Number", "description": "Leaf temperature (CEL)"},
-                "leafWetness": {"type": "Number", "description": "Leaf wetness (P1)"},
-                "dendrometerValue": {"type": "Number", "description": "Dendrometer trunk diameter variation"},
-                "photosyntheticallyActiveRadiation": {"type": "Number", "description": "PAR (UMOL/M2S)"},
-                # Energy / agrivoltaic
-                "panelTemperature": {"type": "Number", "description": "PV panel temperature (CEL)"},
-                "energyProduction": {"type": "Number", "description": "Energy production (KWH)"},
-                "panelInclination": {"type": "Number", "description": "Panel tilt angle (DD)"},
-                # Device health
-                "batteryLevel": {"type": "Number", "description": "Battery level (P1)"},
-                "rssi": {"type": "Number", "description": "Signal strength (DBM)"},
-                # Legacy / generic
-                "measurement": {"type": "Number", "description": "Generic measurement value"},
-                "unit": {"type": "Text", "description": "Measurement unit (UNECE code)"},
-            }
-        },
-        "AgriParcel": {
-            "description": "Agricultural parcel or field",
-            "attributes": {
-                "name": {"type": "Text", "description": "Parcel name"},
-                "location": {"type": "geo:json", "description": "Parcel boundaries"},
-                "area": {"type": "Number", "description": "Parcel area"},
-                "cropType": {"type": "Text", "description": "Type of crop"},
-                "soilType": {"type": "Text", "description": "Type of soil"}
-            }
-        },
-        "AgriOperation": {
-            "description": "Agricultural operation or task",
-            "attributes": {
-                "name": {"type": "Text", "description": "Operation name"},
-                "operationType": {"type": "Text", "description": "Type of operation"},
-                "status": {"type": "Text", "description": "Operation status"},
-                "startDate": {"type": "DateTime", "description": "Operation start date"},
-                "endDate": {"type": "DateTime", "description": "Operation end date"},
-                "location": {"type": "geo:json", "description": "Operation location"}
-            }
-        },
-        "AgriculturalTractor": {
-            "description": "Agricultural tractor or machinery",
-            "attributes": {
-                "name": {"type": "Text", "description": "Tractor/machine name"},
-                "status": {"type": "Text", "description": "Current status"},
-                "location": {"type": "geo:json", "description": "Machine location"},
-                "operationType": {"type": "Text", "description": "Type of operation"},
-                "manufacturer": {"type": "Text", "description": "Manufacturer name"},
-                "model": {"type": "Text", "description": "Model name"},
-                "serialNumber": {"type": "Text", "description": "Serial number"},
-                "isobusCompatible": {"type": "Boolean", "description": "ISOBUS compatibility"}
-            }
-        },
-        "LivestockAnimal": {
-            "description": "Livestock animal with GPS tracking",
-            "attributes": {
-                "name": {"type": "Text", "description": "Animal name"},
-                "species": {"type": "Text", "description": "Animal species"},
-                "breed": {"type": "Text", "description": "Animal breed"},
-                "location": {"type": "geo:json", "description": "Animal location"},
-                "activity": {"type": "Text", "description": "Current activity"},
-                "herdId": {"type": "Text", "description": "Herd identifier"},
-                "birthDate": {"type": "DateTime", "description": "Birth date"},
-                "weight": {"type": "Number", "description": "Animal weight"}
-            }
-        },
-        "WeatherObserved": {
-            "description": "Weather observation station",
-            "attributes": {
-                "name": {"type": "Text", "description": "Station name"},
-                "location": {"type": "geo:json", "description": "Station location"},
-                "temperature": {"type": "Number", "description": "Temperature"},
-                "humidity": {"type": "Number", "description": "Humidity percentage"},
-                "pressure": {"type": "Number", "description": "Atmospheric pressure"},
-                "windSpeed": {"type": "Number", "description": "Wind speed"},
-                "windDirection": {"type": "Number", "description": "Wind direction"},
-                "precipitation": {"type": "Number", "description": "Precipitation"},
-                "observedAt": {"type": "DateTime", "description": "Observation timestamp"}
-            }
-        },
-        # === Additional Entity Types ===
-        "Vineyard": {
-            "description": "Vineyard agricultural area",
-            "attributes": {
-                "name": {"type": "Text", "description": "Vineyard name"},
-                "location": {"type": "geo:json", "description": "Vineyard boundaries"},
-                "area": {"type": "Number", "description": "Area in hectares"},
-                "grapeVariety": {"type": "Text", "description": "Grape variety"}
-            }
-        },
-        "OliveGrove": {
-            "description": "Olive grove area",
-            "attributes": {
-                "name": {"type": "Text", "description": "Olive grove name"},
-                "location": {"type": "geo:json", "description": "Grove boundaries"},
-                "area": {"type": "Number", "description": "Area in hectares"},
-                "treeCount": {"type": "Number", "description": "Number of trees"}
-            }
-        },
-        "AgriCrop": {
-            "description": "Agricultural crop",
-            "attributes": {
-                "name": {"type": "Text", "description": "Crop name"},
-                "location": {"type": "geo:json", "description": "Crop location"},
-                "cropType": {"type": "Text", "description": "Type of crop"},
-                "plantingDate": {"type": "DateTime", "description": "Planting date"}
-            }
-        },
-        "AgriTree": {
-            "description": "Individual agricultural tree",
-            "attributes": {
-                "name": {"type": "Text", "description": "Tree identifier"},
-                "location": {"type": "geo:json", "description": "Tree location"},
-                "species": {"type": "Text", "description": "Tree species"}
-            }
-        },
-        "OliveTree": {
-            "description": "Individual olive tree",
-            "attributes": {
-                "name": {"type": "Text", "description": "Tree identifier"},
-                "location": {"type": "geo:json", "description": "Tree location"},
-                "age": {"type": "Number", "description": "Tree age in years"}
-            }
-        },
-        "Vine": {
-            "description": "Individual vine plant",
-            "attributes": {
-                "name": {"type": "Text", "description": "Vine identifier"},
-                "location": {"type": "geo:json", "description": "Vine location"},
-                "variety": {"type": "Text", "description": "Grape variety"}
-            }
-        },
-        "FruitTree": {
-            "description": "Fruit tree",
-            "attributes": {
-                "name": {"type": "Text", "description": "Tree identifier"},
-                "location": {"type": "geo:json", "description": "Tree location"},
-                "species": {"type": "Text", "description": "Fruit species"}
-            }
-        },
-        "AgriBuilding": {
-            "description": "Agricultural building or structure",
-            "attributes": {
-                "name": {"type": "Text", "description": "Building name"},
-                "location": {"type": "geo:json", "description": "Building location"},
-                "buildingType": {"type": "Text", "description": "Type of building"},
-                "area": {"type": "Number", "description": "Floor area"}
-            }
-        },
-        "WaterSource": {
-            "description": "Water source for irrigation",
-            "attributes": {
-                "name": {"type": "Text", "description": "Source name"},
-                "location": {"type": "geo:json", "description": "Source location"},
-                "sourceType": {"type": "Text", "description": "Type of source"},
-                "capacity": {"type": "Number", "description": "Capacity in liters"}
-            }
-        },
-        "Well": {
-            "description": "Water well",
-            "attributes": {
-                "name": {"type": "Text", "description": "Well name"},
-                "location": {"type": "geo:json", "description": "Well location"},
-                "depth": {"type": "Number", "description": "Well depth"},
-                "flowRate": {"type": "Number", "description": "Flow rate L/min"}
-            }
-        },
-        "IrrigationOutlet": {
-            "description": "Irrigation outlet point",
-            "attributes": {
-                "name": {"type": "Text", "description": "Outlet identifier"},
-                "location": {"type": "geo:json", "description": "Outlet location"},
-                "outletType": {"type": "Text", "description": "Type of outlet"}
-            }
-        },
-        "Spring": {
-            "description": "Natural water spring",
-            "attributes": {
-                "name": {"type": "Text", "description": "Spring name"},
-                "location": {"type": "geo:json", "description": "Spring location"},
-                "flowRate": {"type": "Number", "description": "Flow rate L/min"}
-            }
-        },
-        "Pond": {
-            "description": "Water pond or reservoir",
-            "attributes": {
-                "name": {"type": "Text", "description": "Pond name"},
-                "location": {"type": "geo:json", "description": "Pond boundaries"},
-                "capacity": {"type": "Number", "description": "Capacity in m³"}
-            }
-        },
-        "IrrigationSystem": {
-            "description": "Irrigation system",
-            "attributes": {
-                "name": {"type": "Text", "description": "System name"},
-                "location": {"type": "geo:json", "description": "System coverage"},
-                "systemType": {"type": "Text", "description": "Type of system"}
-            }
-        },
-        "PhotovoltaicInstallation": {
-            "description": "Photovoltaic solar installation",
-            "attributes": {
-                "name": {"type": "Text", "description": "Installation name"},
-                "location": {"type": "geo:json", "description": "Installation location"},
-                "capacity": {"type": "Number", "description": "Capacity in kW"},
-                "panelCount": {"type": "Number", "description": "Number of panels"}
-            }
-        },
-        "EnergyStorageSystem": {
-            "description": "Energy storage system (battery)",
-            "attributes": {
-                "name": {"type": "Text", "description": "System name"},
-                "location": {"type": "geo:json", "description": "System location"},
-                "capacity": {"type": "Number", "description": "Capacity in kWh"},
-                "technology": {"type": "Text", "description": "Battery technology"}
-            }
-        },
-        "Device": {
-            "description": "Generic IoT device (legacy — prefer AgriSensor)",
-            "attributes": {
-                "name": {"type": "Text", "description": "Device name"},
-                "location": {"type": "geo:json", "description": "Device location"},
-                "deviceType": {"type": "Text", "description": "Type of device"}
-            }
-        },
-        "LivestockGroup": {
-            "description": "Group of livestock animals",
-            "attributes": {
-                "name": {"type": "Text", "description": "Group name"},
-                "location": {"type": "geo:json", "description": "Group location"},
-                "species": {"type": "Text", "description": "Animal species"},
-                "count": {"type": "Number", "description": "Number of animals"}
-            }
-        },
-        "LivestockFarm": {
-            "description": "Livestock farm",
-            "attributes": {
-                "name": {"type": "Text", "description": "Farm name"},
-                "location": {"type": "geo:json", "description": "Farm boundaries"},
-                "farmType": {"type": "Text", "description": "Type of farm"}
-            }
-        },
-        "AgriculturalImplement": {
-            "description": "Agricultural implement or attachment",
-            "attributes": {
-                "name": {"type": "Text", "description": "Implement name"},
-                "location": {"type": "geo:json", "description": "Implement location"},
-                "implementType": {"type": "Text", "description": "Type of implement"}
-            }
+def _tenant_remaining(tenant_id: str, entity_type: str) -> int | None:
+    """How many more <entity_type> entities the tenant may create; None when unlimited or unknown"""
+    limit = _ENTITY_LIMIT_MAP.get(entity_type)
+    if limit is None:
+        return None
+    # Refreshes the cached count when it is stale or at the limit
+    _check_tenant_limits(tenant_id, entity_type)
+    cached = _tenant_counts.get((tenant_id, entity_type))
+    if cached is None:
+        # Count unavailable: fail open like _check_tenant_limits
+        return None
+    return max(limit - cached[0], 0)
+
+def _record_entities_created(tenant_id: str, entity_type: str, n: int = 1):
+    """Bump the cached entity count after a successful create"""
+    key = (tenant_id, entity_type)
+    with _tenant_counts_lock:
+        cached = _tenant_counts.get(key)
+        if cached:
+            _tenant_counts[key] = (cached[0] + n, cached[1])
+
+# Static SDM entity catalogue, built once at import time
+_SDM_ENTITIES = {
+    "AgriculturalRobot": {
+        "description": "A robot used in agricultural operations",
+        "attributes": {
+            "name": {"type": "Text", "description": "Robot name"},
+            "status": {"type": "Text", "description": "Current status"},
+            "location": {"type": "geo:json", "description": "Robot location"},
+            "batteryLevel": {"type": "Number", "description": "Battery level percentage"},
+            "currentTask": {"type": "Text", "description": "Current task being performed"}
+        }
+    },
+    "AgriSensor": {
+        "description": "Agricultural sensor device (SAREF4AGRI)",
+        "attributes": {
+            "name": {"type": "Text", "description": "Sensor name"},
+            "description": {"type": "Text", "description": "Sensor description"},
+            "location": {"type": "geo:json", "description": "Sensor location"},
+            "sensorType": {"type": "Text", "description": "Type of sensor"},
+            "controlledProperty": {"type": "List", "description": "Properties measured by this sensor"},
+            "refDeviceProfile": {"type": "Relationship", "description": "Link to DeviceProfile"},
+            # Meteorological / environmental measurements
+            "airTemperature": {"type": "Number", "description": "Air temperature (CEL)"},
+            "relativeHumidity": {"type": "Number", "description": "Relative humidity (P1)"},
+            "atmosphericPressure": {"type": "Number", "description": "Atmospheric pressure (HPA)"},
+            "solarRadiation": {"type": "Number", "description": "Solar radiation (WM2)"},
+            "windSpeed": {"type": "Number", "description": "Wind speed (MTS)"},
+            "windDirection": {"type": "Number", "description": "Wind direction (DD)"},
+            "precipitation": {"type": "Number", "description": "Precipitation (MMT)"},
+            # Soil measurements
+            "soilMoisture": {"type": "Number", "description": "Soil volumetric water content (P1)"},
+            "soilTemperature": {"type": "Number", "description": "Soil temperature (CEL)"},
+            "soilConductivity": {"type": "Number", "description": "Soil electrical conductivity"},
+            # Plant measurements
+            "leafTemperature": {"type": "Number", "description": "Leaf temperature (CEL)"},
+            "leafWetness": {"type": "Number", "description": "Leaf wetness (P1)"},
+            "dendrometerValue": {"type": "Number", "description": "Dendrometer trunk diameter variation"},
+            "photosyntheticallyActiveRadiation": {"type": "Number", "description": "PAR (UMOL/M2S)"},
+            # Energy / agrivoltaic
+            "panelTemperature": {"type": "Number", "description": "PV panel temperature (CEL)"},
+            "energyProduction": {"type": "Number", "description": "Energy production (KWH)"},
+            "panelInclination": {"type": "Number", "description": "Panel tilt angle (DD)"},
+            # Device health
+            "batteryLevel": {"type": "Number", "description": "Battery level (P1)"},
+            "rssi": {"type": "Number", "description": "Signal strength (DBM)"},
+            # Legacy / generic
+            "measurement": {"type": "Number", "description": "Generic measurement value"},
+            "unit": {"type": "Text", "description": "Measurement unit (UNECE code)"},
+        }
+    },
+    "AgriParcel": {
+        "description": "Agricultural parcel or field",
+        "attributes": {
+            "name": {"type": "Text", "description": "Parcel name"},
+            "location": {"type": "geo:json", "description": "Parcel boundaries"},
+            "area": {"type": "Number", "description": "Parcel area"},
+            "cropType": {"type": "Text", "description": "Type of crop"},
+            "soilType": {"type": "Text", "description": "Type of soil"}
+        }
+    },
+    "AgriOperation": {
+        "description": "Agricultural operation or task",
+        "attributes": {
+            "name": {"type": "Text", "description": "Operation name"},
+            "operationType": {"type": "Text", "description": "Type of operation"},
+            "status": {"type": "Text", "description": "Operation status"},
+            "startDate": {"type": "DateTime", "description": "Operation start date"},
+            "endDate": {"type": "DateTime", "description": "Operation end date"},
+            "location": {"type": "geo:json", "description": "Operation location"}
+        }
+    },
+    "AgriculturalTractor": {
+        "description": "Agricultural tractor or machinery",
+        "attributes": {
+            "name": {"type": "Text", "description": "Tractor/machine name"},
+            "status": {"type": "Text", "description": "Current status"},
+            "location": {"type": "geo:json", "description": "Machine location"},
+            "operationType": {"type": "Text", "description": "Type of operation"},
+            "manufacturer": {"type": "Text", "description": "Manufacturer name"},
+            "model": {"type": "Text", "description": "Model name"},
+            "serialNumber": {"type": "Text", "description": "Serial number"},
+            "isobusCompatible": {"type": "Boolean", "description": "ISOBUS compatibility"}
+        }
+    },
+    "LivestockAnimal": {
+        "description": "Livestock animal with GPS tracking",
+        "attributes": {
+            "name": {"type": "Text", "description": "Animal name"},
+            "species": {"type": "Text", "description": "Animal species"},
+            "breed": {"type": "Text", "description": "Animal breed"},
+            "location": {"type": "geo:json", "description": "Animal location"},
+            "activity": {"type": "Text", "description": "Current activity"},
+            "herdId": {"type": "Text", "description": "Herd identifier"},
+            "birthDate": {"type": "DateTime", "description": "Birth date"},
+            "weight": {"type": "Number", "description": "Animal weight"}
+        }
+    },
+    "WeatherObserved": {
+        "description": "Weather observation station",
+        "attributes": {
+            "name": {"type": "Text", "description": "Station name"},
+            "location": {"type": "geo:json", "description": "Station location"},
+            "temperature": {"type": "Number", "description": "Temperature"},
+            "humidity": {"type": "Number", "description": "Humidity percentage"},
+            "pressure": {"type": "Number", "description": "Atmospheric pressure"},
+            "windSpeed": {"type": "Number", "description": "Wind speed"},
+            "windDirection": {"type": "Number", "description": "Wind direction"},
+            "precipitation": {"type": "Number", "description": "Precipitation"},
+            "observedAt": {"type": "DateTime", "description": "Observation timestamp"}
+        }
+    },
+    # === Additional Entity Types ===
+    "Vineyard": {
+        "description": "Vineyard agricultural area",
+        "attributes": {
+            "name": {"type": "Text", "description": "Vineyard name"},
+            "location": {"type": "geo:json", "description": "Vineyard boundaries"},
+            "area": {"type": "Number", "description": "Area in hectares"},
+            "grapeVariety": {"type": "Text", "description": "Grape variety"}
+        }
+    },
+    "OliveGrove": {
+        "description": "Olive grove area",
+        "attributes": {
+            "name": {"type": "Text", "description": "Olive grove name"},
+            "location": {"type": "geo:json", "description": "Grove boundaries"},
+            "area": {"type": "Number", "description": "Area in hectares"},
+            "treeCount": {"type": "Number", "description": "Number of trees"}
+        }
+    },
+    "AgriCrop": {
+        "description": "Agricultural crop",
+        "attributes": {
+            "name": {"type": "Text", "description": "Crop name"},
+            "location": {"type": "geo:json", "description": "Crop location"},
+            "cropType": {"type": "Text", "description": "Type of crop"},
+            "plantingDate": {"type": "DateTime", "description": "Planting date"}
+        }
+    },
+    "AgriTree": {
+        "description": "Individual agricultural tree",
+        "attributes": {
+            "name": {"type": "Text", "description": "Tree identifier"},
+            "location": {"type": "geo:json", "description": "Tree location"},
+            "species": {"type": "Text", "description": "Tree species"}
+        }
+    },
+    "OliveTree": {
+        "description": "Individual olive tree",
+        "attributes": {
+            "name": {"type": "Text", "description": "Tree identifier"},
+            "location": {"type": "geo:json", "description": "Tree location"},
+            "age": {"type": "Number", "description": "Tree age in years"}
+        }
+    },
+    "Vine": {
+        "description": "Individual vine plant",
+        "attributes": {
+            "name": {"type": "Text", "description": "Vine identifier"},
+            "location": {"type": "geo:json", "description": "Vine location"},
+            "variety": {"type": "Text", "description": "Grape variety"}
+        }
+    },
+    "FruitTree": {
+        "description": "Fruit tree",
+        "attributes": {
+            "name": {"type": "Text", "description": "Tree identifier"},
+            "location": {"type": "geo:json", "description": "Tree location"},
+            "species": {"type": "Text", "description": "Fruit species"}
+        }
+    },
+    "AgriBuilding": {
+        "description": "Agricultural building or structure",
+        "attributes": {
+            "name": {"type": "Text", "description": "Building name"},
+            "location": {"type": "geo:json", "description": "Building location"},
+            "buildingType": {"type": "Text", "description": "Type of building"},
+            "area": {"type": "Number", "description": "Floor area"}
+        }
+    },
+    "WaterSource": {
+        "description": "Water source for irrigation",
+        "attributes": {
+            "name": {"type": "Text", "description": "Source name"},
+            "location": {"type": "geo:json", "description": "Source location"},
+            "sourceType": {"type": "Text", "description": "Type of source"},
+            "capacity": {"type": "Number", "description": "Capacity in liters"}
+        }
+    },
+    "Well": {
+        "description": "Water well",
+        "attributes": {
+            "name": {"type": "Text", "description": "Well name"},
+            "location": {"type": "geo:json", "description": "Well location"},
+            "depth": {"type": "Number", "description": "Well depth"},
+            "flowRate": {"type": "Number", "description": "Flow rate L/min"}
+        }
+    },
+    "IrrigationOutlet": {
+        "description": "Irrigation outlet point",
+        "attributes": {
+            "name": {"type": "Text", "description": "Outlet identifier"},
+            "location": {"type": "geo:json", "description": "Outlet location"},
+            "outletType": {"type": "Text", "description": "Type of outlet"}
+        }
+    },
+    "Spring": {
+        "description": "Natural water spring",
+        "attributes": {
+            "name": {"type": "Text", "description": "Spring name"},
+            "location": {"type": "geo:json", "description": "Spring location"},
+            "flowRate": {"type": "Number", "description": "Flow rate L/min"}
+        }
+    },
+    "Pond": {
+        "description": "Water pond or reservoir",
+        "attributes": {
+            "name": {"type": "Text", "description": "Pond name"},
+            "location": {"type": "geo:json", "description": "Pond boundaries"},
+            "capacity": {"type": "Number", "description": "Capacity in m³"}
+        }
+    },
+    "IrrigationSystem": {
+        "description": "Irrigation system",
+        "attributes": {
+            "name": {"type": "Text", "description": "System name"},
+            "location": {"type": "geo:json", "description": "System coverage"},
+            "systemType": {"type": "Text", "description": "Type of system"}
+        }
+    },
+    "PhotovoltaicInstallation": {
+        "description": "Photovoltaic solar installation",
+        "attributes": {
+            "name": {"type": "Text", "description": "Installation name"},
+            "location": {"type": "geo:json", "description": "Installation location"},
+            "capacity": {"type": "Number", "description": "Capacity in kW"},
+            "panelCount": {"type": "Number", "description": "Number of panels"}
+        }
+    },
+    "EnergyStorageSystem": {
+        "description": "Energy storage system (battery)",
+        "attributes": {
+            "name": {"type": "Text", "description": "System name"},
+            "location": {"type": "geo:json", "description": "System location"},
+            "capacity": {"type": "Number", "description": "Capacity in kWh"},
+            "technology": {"type": "Text", "description": "Battery technology"}
+        }
+    },
+    "Device": {
+        "description": "Generic IoT device (legacy — prefer AgriSensor)",
+        "attributes": {
+            "name": {"type": "Text", "description": "Device name"},
+            "location": {"type": "geo:json", "description": "Device location"},
+            "deviceType": {"type": "Text", "description": "Type of device"}
+        }
+    },
+    "LivestockGroup": {
+        "description": "Group of livestock animals",
+        "attributes": {
+            "name": {"type": "Text", "description": "Group name"},
+            "location": {"type": "geo:json", "description": "Group location"},
+            "species": {"type": "Text", "description": "Animal species"},
+            "count": {"type": "Number", "description": "Number of animals"}
+        }
+    },
+    "LivestockFarm": {
+        "description": "Livestock farm",
+        "attributes": {
+            "name": {"type": "Text", "description": "Farm name"},
+            "location": {"type": "geo:json", "description": "Farm boundaries"},
+            "farmType": {"type": "Text", "description": "Type of farm"}
+        }
+    },
+    "AgriculturalImplement": {
+        "description": "Agricultural implement or attachment",
+        "attributes": {
+            "name": {"type": "Text", "description": "Implement name"},
+            "location": {"type": "geo:json", "description": "Implement location"},
+            "implementType": {"type": "Text", "description": "Type of implement"}
         }
     }
+}
+
+# Pre-serialized list payload; only the tenant is appended per request
+_SDM_ENTITIES_JSON_PREFIX = orjson.dumps({
+    'entities': _SDM_ENTITIES,
+    'count': len(_SDM_ENTITIES)
+})[:-1]
+
+# Pre-serialized per-type schema payloads; only the tenant is appended per request
+_SDM_ENTITY_JSON_CACHE = {
+    entity_type: orjson.dumps({'entityType': entity_type, 'schema': schema})
+    for entity_type, schema in _SDM_ENTITIES.items()
+}
+
+# Per-type schema digests computed once at boot; the ETag mixes in the tenant
+# because the response body carries it
+_SDM_SCHEMA_DIGEST = {
+    entity_type: hashlib.blake2b(blob, digest_size=8).digest()
+    for entity_type, blob in _SDM_ENTITY_JSON_CACHE.items()
+}
+
+# Static 404 for unknown entity types. Kept as (body, status, headers) so Flask
+# builds a fresh Response each time; CORS hooks mutate the response object
+_NOT_FOUND_RESP = (b'{"error":"Entity type not found"}', 404, {'Content-Type': 'application/json'})
+
+def _sdm_schema_etag(entity_type: str, tenant: str) -> str:
+    """Strong ETag for a schema response as served to a tenant"""
+    digest = hashlib.blake2b(_SDM_SCHEMA_DIGEST[entity_type] + tenant.encode(), digest_size=8)
+    return '"' + digest.hexdigest() + '"'
+
+def get_sdm_entities():
+    """Get available SDM entities"""
+    return _SDM_ENTITIES
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -646,12 +892,8 @@ def health_check():
 def list_sdm_entities():
     """List available SDM entity types"""
     try:
-        entities = get_sdm_entities()
-        return jsonify({
-            'entities': entities,
-            'count': len(entities),
-            'tenant': g.tenant
-        })
+        body = _SDM_ENTITIES_JSON_PREFIX + b',"tenant":' + orjson.dumps(g.tenant) + b'}'
+        return Response(body, mimetype='application/json')
     except Exception as e:
         logger.error(f"Error listing SDM entities: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -661,15 +903,16 @@ def list_sdm_entities():
 def get_sdm_entity_schema(entity_type):
     """Get SDM entity schema"""
     try:
-        entities = get_sdm_entities()
-        if entity_type not in entities:
-           return jsonify({'error': 'Entity type not found'}), 404
+        blob = _SDM_ENTITY_JSON_CACHE.get(entity_type)
+        if blob is None:
+           return _NOT_FOUND_RESP
         
-        return jsonify({
-            'entityType': entity_type,
-            'schema': entities[entity_type],
-            'tenant': g.tenant
-        })
+        etag = _sdm_schema_etag(entity_type, g.tenant)
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=304, headers={'ETag': etag})
+        
+        body = blob[:-1] + b',"tenant":' + orjson.dumps(g.tenant) + b'}'
+        return Response(body, mimetype='application/json', headers={'ETag': etag})
     except Exception as e:
         logger.error(f"Error getting SDM entity schema: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -687,20 +930,18 @@ def list_entity_instances(entity_type):
         }
         
         # Add pagination support
-        limit = request.args.get('limit', type=int)
-        offset = request.args.get('offset', type=int)
+        args = request.args
+        limit = args.get('limit', type=int)
+        offset = args.get('offset', type=int)
         
         if limit is not None:
             params['limit'] = limit
         if offset is not None:
             params['offset'] = offset
         
-        headers = {
-            'Accept': 'application/ld+json'
-        }
-        headers = inject_fiware_headers(headers, g.tenant)
+        headers = _orion_ld_headers(g.tenant, 'Accept')
         
-        response = requests.get(orion_url, params=params, headers=headers, timeout=10)
+        response = _http_session.get(orion_url, params=params, headers=headers, timeout=10)
         
         # Handle tenant not found (404) - return empty list instead of error
         if response.status_code == 404:
@@ -716,44 +957,32 @@ def list_entity_instances(entity_type):
             logger.error(f"Failed to query Orion for {entity_type}: {response.status_code} - {response.text}")
             return jsonify({'error': 'Failed to query Orion'}), 500
             
-        # Get total count from header
+        # options=count returns the total in a header alongside the page body
         total_count = int(response.headers.get('NGSILD-Results-Count', 0))
+        raw = response.content
+        entities = orjson.loads(raw)
         
-        # Get actual entities
-        params.pop('options')
-        response = requests.get(orion_url, params=params, headers=headers, timeout=10)
-        
-        # Handle tenant not found (404) - return empty list instead of error
-        if response.status_code == 404:
-            logger.info(f"Tenant {g.tenant} not found in Orion-LD for {entity_type}, returning empty list")
-            return jsonify({
-                'entityType': entity_type,
-                'instances': [],
-                'count': 0,
-                'tenant': g.tenant
-            }), 200
-        
-        if response.status_code != 200:
-            logger.error(f"Failed to get entities from Orion for {entity_type}: {response.status_code} - {response.text}")
-            return jsonify({'error': 'Failed to get entities from Orion'}), 500
-        
-        entities = response.json()
-        
-        # Ensure entities is a list (Orion-LD may return a single object or a list)
-        if not isinstance(entities, list):
+        # Ensure entities is a list (Orion-LD may return a single object or a list).
+        # A list body is spliced into the response verbatim instead of re-encoded.
+        if isinstance(entities, list):
+            instances_json = raw
+        else:
             entities = [entities] if entities else []
+            instances_json = orjson.dumps(entities)
         
         # Log the operation
         log_entity_operation('list', None, entity_type, g.tenant, g.farmer_id, 
                            {'count': len(entities)})
         
-        return jsonify({
-            'entityType': entity_type,
-            'instances': entities,
-            'count': len(entities),
-            'total': total_count,
-            'tenant': g.tenant
-        })
+        body = b''.join((
+            b'{"entityType":', orjson.dumps(entity_type),
+            b',"instances":', instances_json,
+            b',"count":', str(len(entities)).encode(),
+            b',"total":', str(total_count).encode(),
+            b',"tenant":', orjson.dumps(g.tenant),
+            b'}'
+        ))
+        return Response(body, mimetype='application/json')
     
     except requests.exceptions.Timeout:
         logger.error(f"Timeout querying Orion-LD for {entity_type}")
@@ -763,6 +992,43 @@ def list_entity_instances(entity_type):
         return jsonify({'error': 'Internal server error'}), 500
 
 
+# Entity attributes read when provisioning an IoT device
+_IOT_FIELDS = frozenset(('location', 'name', 'refDeviceProfile'))
+
+def _extract_iot_fields(data: dict, default_name: str) -> tuple:
+    """
+    Get (location, device_name, profile_id) from request data or an NGSI-LD
+    entity. Location and profile_id are None when absent; the profile id is
+    taken from a refDeviceProfile Relationship.
+    """
+    present = data.keys() & _IOT_FIELDS
+    if not present:
+        return None, default_name, None
+
+    location = None
+    if 'location' in present:
+        loc = data['location']
+        if isinstance(loc, dict) and 'coordinates' in loc:
+            location = loc
+        elif isinstance(loc, dict) and 'value' in loc:
+            location = loc['value']
+
+    device_name = data.get('name', default_name)
+    if isinstance(device_name, dict):
+        device_name = device_name.get('value', default_name)
+
+    profile_id = None
+    if 'refDeviceProfile' in present:
+        ref = data['refDeviceProfile']
+        if isinstance(ref, dict) and 'object' in ref:
+            ref_obj = ref['object']
+            profile_id = ref_obj.split(':')[-1] if ':' in ref_obj else ref_obj
+
+    return location, device_name, profile_id
+
+# Request keys that are not copied into the NGSI-LD entity as attributes
+_ENTITY_RESERVED_KEYS = frozenset(('id', 'type', '@context'))
+
 @app.route('/sdm/entities/<entity_type>/instances', methods=['POST'])
 @require_auth
 def create_entity_instance(entity_type):
@@ -775,6 +1041,15 @@ def create_entity_instance(entity_type):
         # Validate entity type against allowed schemas if necessary, or just rely on Orion
         # if entity_type not in ALLOWED_ENTITY_TYPES: # If we had such a list
         #    return jsonify({'error': 'Entity type not found'}), 404
+
+        # Load the DeviceProfile (read-only) in the background while the limit
+        # check and Orion-LD create run on the request thread
+        iot_fields = None
+        profile_future = None
+        if entity_type in IOT_ENTITY_TYPES:
+            iot_fields = _extract_iot_fields(data, None)
+            if iot_fields[2]:
+                profile_future = _PROVISION_POOL.submit(get_profile_iot_attributes, iot_fields[2])
             
         # Check tenant limits
         if not _check_tenant_limits(g.tenant, entity_type):
@@ -789,42 +1064,39 @@ def create_entity_instance(entity_type):
         if not entity_id.startswith('urn:ngsi-ld:'):
             entity_id = f"urn:ngsi-ld:{entity_type}:{entity_id}"
         
-        # Build NGSI-LD compliant entity with unified SOTA context
+        # Build NGSI-LD compliant entity (the unified SOTA context is prepended
+        # as pre-serialized bytes below)
         entity_data = {
-            '@context': SOTA_CONTEXT,
             'id': entity_id,
             'type': entity_type
         }
         
-        # Add properties from data (convert to NGSI-LD Property format)
-        for key, value in data.items():
-            if key in ['id', 'type', '@context']:
-                continue
-            if isinstance(value, dict) and 'type' in value:
-                # Already in NGSI-LD format
-                entity_data[key] = value
-            else:
-                # Convert to NGSI-LD Property format
-                entity_data[key] = {
-                    'type': 'Property',
-                    'value': value
-                }
+        # Add properties from data; values already in NGSI-LD format (a dict
+        # with 'type') pass through, anything else is wrapped as a Property.
+        # get_json() only yields plain dicts, so an exact type check suffices
+        entity_data.update({
+            key: value if type(value) is dict and 'type' in value else {'type': 'Property', 'value': value}
+            for key, value in data.items()
+            if key not in _ENTITY_RESERVED_KEYS
+        })
+        
+        # Serialized once: sent to Orion-LD and embedded in the response as-is
+        entity_json = _ENTITY_CONTEXT_PREFIX + orjson.dumps(entity_data)[1:]
         
         # Send to Orion-LD
         orion_url = f"{ORION_URL}/ngsi-ld/v1/entities"
-        headers = {
-            'Content-Type': 'application/ld+json'
-        }
-        headers = inject_fiware_headers(headers, g.tenant)
+        headers = _orion_ld_headers(g.tenant, 'Content-Type')
         
         logger.info(f"Creating entity {entity_id} of type {entity_type} for tenant {g.tenant}")
-        logger.debug(f"Entity data: {entity_data}")
-        logger.debug(f"Orion URL: {orion_url}")
+        logger.debug("Entity data: %s", entity_json)
+        logger.debug("Orion URL: %s", orion_url)
         
-        response = requests.post(orion_url, json=entity_data, headers=headers)
+        response = _http_session.post(orion_url, data=entity_json, headers=headers)
         logger.info(f"Orion response status: {response.status_code}")
         
         if response.status_code in [200, 201]:
+            _record_entities_created(g.tenant, entity_type)
+
             # Log the operation
             log_entity_operation('create', entity_id, entity_type, g.tenant, g.farmer_id, 
                                {'attributes': list(entity_data.keys())})
@@ -832,7 +1104,7 @@ def create_entity_instance(entity_type):
             # Build response
             response_data = {
                 'message': 'Entity created successfully',
-                'entity': entity_data,
+                'entity': orjson.Fragment(entity_json),
                 'entity_id': entity_id,
                 'tenant': g.tenant
             }
@@ -843,28 +1115,10 @@ def create_entity_instance(entity_type):
             if entity_type in IOT_ENTITY_TYPES:
                 logger.info(f"Entity type {entity_type} requires IoT provisioning")
                 
-                # Extract location if present
-                location = None
-                if 'location' in data:
-                    loc = data['location']
-                    if isinstance(loc, dict) and 'coordinates' in loc:
-                        location = loc
-                    elif isinstance(loc, dict) and 'value' in loc:
-                        location = loc['value']
-                
-                # Extract controlled properties if present
-                # Get device name
-                device_name = data.get('name', entity_id)
-                if isinstance(device_name, dict):
-                    device_name = device_name.get('value', entity_id)
-
-                # Extract Profile ID from Relationship (mandatory for IoT types)
-                profile_id = None
-                if 'refDeviceProfile' in data:
-                    ref = data['refDeviceProfile']
-                    if isinstance(ref, dict) and 'object' in ref:
-                         ref_obj = ref['object']
-                         profile_id = ref_obj.split(':')[-1] if ':' in ref_obj else ref_obj
+                # Profile ID comes from a Relationship (mandatory for IoT types)
+                location, device_name, profile_id = iot_fields
+                if device_name is None:
+                    device_name = entity_id
 
                 if not profile_id:
                     return jsonify({
@@ -872,6 +1126,11 @@ def create_entity_instance(entity_type):
                                  'Provide refDeviceProfile as a Relationship with a valid profile ID.'
                     }), 400
 
+                # The prefetch fills the profile cache that provision_iot_device
+                # reads; load errors are reported by provision_iot_device itself
+                if profile_future:
+                    wait([profile_future])
+
                 # Provision in IoT Agent
                 iot_result = provision_iot_device(
                     entity_id=entity_id,
@@ -903,7 +1162,7 @@ def create_entity_instance(entity_type):
                     response_data['message'] = 'Entity created but IoT provisioning failed'
                     logger.warning(f"IoT provisioning failed for {entity_id}: {iot_result['error']}")
             
-            return jsonify(response_data), 201
+            return Response(orjson.dumps(response_data), status=201, mimetype='application/json')
         else:
             logger.error(f"Orion error: {response.status_code} - {response.text}")
             return jsonify({
@@ -922,23 +1181,45 @@ def create_entity_instance(entity_type):
 def get_sdm_entity_instance(entity_type, entity_id):
     """Get specific SDM entity instance"""
     try:
-        orion_url = f"{ORION_URL}/ngsi-ld/v1/entities/{entity_id}"
-        headers = {
-            'Accept': 'application/ld+json'
-        }
-        headers = inject_fiware_headers(headers, g.tenant)
+        cache = _get_entity_cache()
+        cache_key = _entity_cache_key(g.tenant, entity_id)
+        entity_json = None
+        if cache is not None:
+            try:
+                entity_json = cache.get(cache_key)
+            except Exception as e:
+                logger.warning("Entity cache read failed for %s: %s", entity_id, e)
         
-        response = requests.get(orion_url, headers=headers)
-        if response.status_code == 200:
-            entity = response.json()
-            return jsonify({
-                'entity': entity,
-                'tenant': g.tenant
-            })
-        elif response.status_code == 404:
-            return jsonify({'error': 'Entity not found'}), 404
-        else:
-            return jsonify({'error': 'Failed to get entity from Orion'}), 500
+        if entity_json is None:
+            orion_url = f"{ORION_URL}/ngsi-ld/v1/entities/{entity_id}"
+            headers = _orion_ld_headers(g.tenant, 'Accept')
+            
+            response = _http_session.get(orion_url, headers=headers)
+            if response.status_code == 404:
+                return jsonify({'error': 'Entity not found'}), 404
+            elif response.status_code != 200:
+                return jsonify({'error': 'Failed to get entity from Orion'}), 500
+            
+            entity_json = response.content
+            if cache is not None:
+                try:
+                    cache.set(cache_key, entity_json, ex=ENTITY_CACHE_TTL)
+                except Exception as e:
+                    logger.warning("Entity cache write failed for %s: %s", entity_id, e)
+        
+        # Strong ETag over the entity bytes and the tenant echoed in the body
+        tenant_json = orjson.dumps(g.tenant)
+        etag = '"' + hashlib.blake2b(entity_json + tenant_json, digest_size=8).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=304, headers={'ETag': etag})
+        
+        # The cached/Orion entity body is spliced into the response verbatim
+        body = b''.join((
+            b'{"entity":', entity_json,
+            b',"tenant":', tenant_json,
+            b'}'
+        ))
+        return Response(body, mimetype='application/json', headers={'ETag': etag})
     
     except Exception as e:
         logger.error(f"Error getting SDM entity instance: {e}")
@@ -955,13 +1236,12 @@ def update_sdm_entity_instance(entity_type, entity_id):
             return jsonify({'error': 'No data provided'}), 400
         
         orion_url = f"{ORION_URL}/ngsi-ld/v1/entities/{entity_id}/attrs"
-        headers = {
-            'Content-Type': 'application/ld+json'
-        }
-        headers = inject_fiware_headers(headers, g.tenant)
+        headers = _orion_ld_headers(g.tenant, 'Content-Type')
         
-        response = requests.patch(orion_url, json=data, headers=headers)
+        response = _http_session.patch(orion_url, data=orjson.dumps(data), headers=headers)
         if response.status_code in [200, 204]:
+            _invalidate_cached_entity(g.tenant, entity_id)
+            
             # Log the operation
             log_entity_operation('update', entity_id, entity_type, g.tenant, g.farmer_id, 
                                {'updated_attributes': list(data.keys())})
@@ -988,11 +1268,12 @@ def delete_sdm_entity_instance(entity_type, entity_id):
     """Delete specific SDM entity instance"""
     try:
         orion_url = f"{ORION_URL}/ngsi-ld/v1/entities/{entity_id}"
-        headers = {}
-        headers = inject_fiware_headers(headers, g.tenant)
+        headers = _fiware_headers_for(g.tenant)
         
-        response = requests.delete(orion_url, headers=headers)
+        response = _http_session.delete(orion_url, headers=headers)
         if response.status_code in [200, 204]:
+            _invalidate_cached_entity(g.tenant, entity_id)
+            
             # Log the operation
             log_entity_operation('delete', entity_id, entity_type, g.tenant, g.farmer_id)
             
@@ -1017,11 +1298,20 @@ def create_entity_batch(entity_type):
     Batch create entities of <entity_type> from a simplified list of records.
 
     Body: { "entities": [ { "name": str, "lat": float, "lng": float, ... }, ... ] }
-    Response 201: { "created": N, "errors": [], "entity_ids": [...] }
-    Response 207: { "created": N, "errors": [...], "entity_ids": [...] }
-
-    Skips IoT provisioning — intended for static assets (trees, crop elements,
-    structural assets) imported from GPS surveys or GeoJSON/CSV files.
+    Response 201: { "created": N, "errors": [], "entity_ids": [...], "iot_provisioning"?: {...} }
+    Response 207: { "created": N, "errors": [...], "entity_ids": [...], "iot_provisioning"?: {...} }
+    Response 400: { "created": 0, "errors": [...], "entity_ids": [] } when every row was rejected
+
+    Intended for static assets (trees, crop elements, structural assets)
+    imported from GPS surveys or GeoJSON/CSV files, so IoT provisioning is
+    skipped unless a row of an IoT type carries "refDeviceProfile" (profile
+    id, URN or NGSI-LD Relationship). Those rows count against the tenant's
+    entity limit like single creates; rows over the limit or with a malformed
+    refDeviceProfile are not created and are reported in "errors" as
+    {index, error}. The rest are registered in the IoT Agent with a single
+    bulk request, whose result (see provision_iot_devices_bulk) is returned
+    under "iot_provisioning" only when such rows exist. Orion partial
+    failures are appended to "errors" in Orion's own format.
     Maximum 500 entities per request.
     """
     try:
@@ -1039,13 +1329,22 @@ def create_entity_batch(entity_type):
 
         RESERVED = {'name', 'lat', 'lng', 'latitude', 'longitude', 'description', 'id'}
 
+        # Random id suffixes for the whole batch from a single urandom call
+        # (same urn:ngsi-ld:{Type}:{16 hex} shape as generate_entity_id)
+        id_suffixes = os.urandom(8 * len(rows)).hex()
+
         ngsi_entities = []
+        iot_specs = []
+        row_errors = []
+        # Remaining quota for IoT rows, looked up on the first one (None = no limit)
+        iot_remaining = None
+        limit_checked = False
         for i, row in enumerate(rows):
             name = row.get('name') or f'{entity_type}_{i + 1}'
             lat  = row.get('lat') or row.get('latitude')
             lng  = row.get('lng') or row.get('longitude')
 
-            entity_id = f"urn:ngsi-ld:{entity_type}:{uuid.uuid4().hex[:16]}"
+            entity_id = f"urn:ngsi-ld:{entity_type}:{id_suffixes[16 * i:16 * (i + 1)]}"
 
             entity: dict = {
                 '@context': SOTA_CONTEXT,
@@ -1069,34 +1368,78 @@ def create_entity_batch(entity_type):
                     continue
                 entity[k] = {'type': 'Property', 'value': v}
 
+            ref_profile = row.get('refDeviceProfile')
+            if ref_profile and entity_type in IOT_ENTITY_TYPES:
+                # Same forms as single create: id/URN string or a Relationship
+                if isinstance(ref_profile, dict):
+                    ref_profile = ref_profile.get('object')
+                if not ref_profile or not isinstance(ref_profile, str):
+                    row_errors.append({
+                        'index': i,
+                        'error': 'refDeviceProfile must be a profile id, URN or Relationship'
+                    })
+                    continue
+                if not limit_checked:
+                    iot_remaining = _tenant_remaining(g.tenant, entity_type)
+                    limit_checked = True
+                if iot_remaining is not None and len(iot_specs) >= iot_remaining:
+                    row_errors.append({
+                        'index': i,
+                        'error': f'Tenant limit reached for {entity_type}. Please upgrade your plan.'
+                    })
+                    continue
+                profile_id = ref_profile.split(':')[-1]
+                entity['refDeviceProfile'] = {
+                    'type': 'Relationship',
+                    'object': f"urn:ngsi-ld:DeviceProfile:{profile_id}",
+                }
+                iot_specs.append({
+                    'entity_id': entity_id,
+                    'entity_type': entity_type,
+                    'profile_id': profile_id,
+                    'location': entity.get('location', {}).get('value'),
+                })
+
             ngsi_entities.append(entity)
 
+        if not ngsi_entities:
+            return jsonify({'created': 0, 'errors': row_errors, 'entity_ids': []}), 400
+
         # Orion-LD batch create endpoint
         batch_url = f"{ORION_URL}/ngsi-ld/v1/entityOperations/create"
-        headers = {'Content-Type': 'application/ld+json'}
-        headers = inject_fiware_headers(headers, g.tenant)
+        headers = _orion_ld_headers(g.tenant, 'Content-Type')
 
-        response = requests.post(batch_url, json=ngsi_entities, headers=headers)
+        response = _http_session.post(batch_url, data=orjson.dumps(ngsi_entities), headers=headers)
 
         entity_ids = [e['id'] for e in ngsi_entities]
 
         if response.status_code in [200, 201, 204]:
+            _record_entities_created(g.tenant, entity_type, len(ngsi_entities))
             log_entity_operation(
                 'batch_create', entity_type, entity_type, g.tenant, g.farmer_id,
                 {'count': len(ngsi_entities)}
             )
-            return jsonify({'created': len(ngsi_entities), 'errors': [], 'entity_ids': entity_ids}), 201
+            body = {'created': len(ngsi_entities), 'errors': row_errors, 'entity_ids': entity_ids}
+            if iot_specs:
+                body['iot_provisioning'] = provision_iot_devices_bulk(iot_specs, g.tenant)
+            return jsonify(body), 207 if row_errors else 201
 
         # 207 Multi-Status: Orion returns partial success
         if response.status_code == 207:
-            result = response.json() if response.content else {}
+            result = orjson.loads(response.content) if response.content else {}
             success_ids = result.get('success', entity_ids)
-            errors = result.get('errors', [])
+            errors = row_errors + result.get('errors', [])
+            _record_entities_created(g.tenant, entity_type, len(success_ids))
             log_entity_operation(
                 'batch_create', entity_type, entity_type, g.tenant, g.farmer_id,
                 {'count': len(success_ids), 'errors': len(errors)}
             )
-            return jsonify({'created': len(success_ids), 'errors': errors, 'entity_ids': success_ids}), 207
+            body = {'created': len(success_ids), 'errors': errors, 'entity_ids': success_ids}
+            created = set(success_ids)
+            created_specs = [spec for spec in iot_specs if spec['entity_id'] in created]
+            if created_specs:
+                body['iot_provisioning'] = provision_iot_devices_bulk(created_specs, g.tenant)
+            return jsonify(body), 207
 
         logger.error(f"Orion batch create failed {response.status_code}: {response.text[:300]}")
         return jsonify({'error': 'Batch create failed', 'detail': response.text[:300]}), 500
@@ -1131,31 +1474,20 @@ def regenerate_iot_key(entity_id):
     try:
         # Get entity type from Orion to confirm it's an IoT device
         orion_url = f"{ORION_URL}/ngsi-ld/v1/entities/{entity_id}"
-        headers = inject_fiware_headers({'Accept': 'application/ld+json'}, g.tenant)
-        response = requests.get(orion_url, headers=headers)
+        headers = _orion_ld_headers(g.tenant, 'Accept')
+        response = _http_session.get(orion_url, headers=headers)
         
         if response.status_code != 200:
             return jsonify({'error': 'Entity not found'}), 404
             
-        entity = response.json()
+        entity = orjson.loads(response.content)
         entity_type = entity['type']
         
         if entity_type not in IOT_ENTITY_TYPES:
              return jsonify({'error': f'Entity type {entity_type} does not support IoT provisioning'}), 400
              
-        # Extract name for device naming consistency
-        device_name = entity_id.split(':')[-1]
-        if 'name' in entity:
-             val = entity['name']
-             device_name = val['value'] if isinstance(val, dict) and 'value' in val else val
-
-        # Extract profile_id from refDeviceProfile Relationship
-        profile_id = None
-        if 'refDeviceProfile' in entity:
-            ref = entity['refDeviceProfile']
-            if isinstance(ref, dict) and 'object' in ref:
-                ref_obj = ref['object']
-                profile_id = ref_obj.split(':')[-1] if ':' in ref_obj else ref_obj
+        # Name (for device naming consistency) and profile_id from refDeviceProfile
+        _, device_name, profile_id = _extract_iot_fields(entity, entity_id.split(':')[-1])
 
         if not profile_id:
             return jsonify({
@@ -1200,7 +1532,7 @@ def get_iot_details(entity_id):
         return jsonify({
             'mqtt_host': MQTT_HOST,
             'mqtt_port': MQTT_PORT,
-            'protocol': 'mqtts' if MQTT_PORT == 8883 else 'mqtt',
+            'protocol': MQTT_PROTOCOL,
             'device_id': device_id,
             'topics': {
                 'publish_data': f'/<API_KEY>/{device_id}/attrs',
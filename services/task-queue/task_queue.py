@@ -5,12 +5,14 @@
 # Provides task queue functionality using Redis Streams for async processing
 
 import os
+import sys
 import json
 import logging
+import threading
 import uuid
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from urllib.parse import quote
 
 try:
@@ -20,6 +22,22 @@ except ImportError:
     REDIS_AVAILABLE = False
     logging.warning("Redis not available, task queue will be disabled")
 
+try:
+    import orjson
+    # Match json.dumps(default=str): non-str keys are stringified and
+    # datetimes go through default=str instead of orjson's RFC 3339 output
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def _json_dumps(data: Any) -> str:
+        return orjson.dumps(data, default=str, option=_ORJSON_OPTIONS).decode()
+
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(data: Any) -> str:
+        return json.dumps(data, default=str)
+
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
 # Redis configuration
@@ -29,11 +47,22 @@ REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', os.getenv('REDIS_PASS'))  # Support
 # Debug logging (only at module level, not during import)
 # Will log when TaskQueue is initialized
 
+# Maximum XADDs sent in one pipeline round trip by enqueue_tasks_bulk
+ENQUEUE_PIPELINE_CHUNK = 1000
+
+# Approximate stream length cap applied on XADD (MAXLEN ~); 0 disables trimming.
+# Entries beyond the cap are trimmed even if unread, so keep it well above backlog.
+STREAM_MAXLEN = int(os.getenv('TASK_QUEUE_MAXLEN', '100000'))
+
+# Default XREADGROUP batch size and block timeout for consumers
+CONSUME_COUNT = int(os.getenv('TASK_QUEUE_CONSUME_COUNT', '100'))
+CONSUME_BLOCK_MS = 1000
+
 # Redis connection pool
 _redis_pool = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Task:
     """Task structure for queue"""
     id: str
@@ -52,6 +81,29 @@ class Task:
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.utcnow().isoformat()
+    
+    def to_fields(self) -> Dict[str, Any]:
+        """Redis stream fields for this task (None values omitted, Redis doesn't accept them)"""
+        fields = {
+            'id': self.id,
+            'tenant_id': self.tenant_id,
+            'task_type': self.task_type,
+            'payload': self.payload,
+            'status': self.status,
+            'retry_count': self.retry_count,
+            'max_retries': self.max_retries,
+        }
+        if self.created_at is not None:
+            fields['created_at'] = self.created_at
+        if self.started_at is not None:
+            fields['started_at'] = self.started_at
+        if self.completed_at is not None:
+            fields['completed_at'] = self.completed_at
+        if self.error_message is not None:
+            fields['error_message'] = self.error_message
+        if self.result is not None:
+            fields['result'] = self.result
+        return fields
 
 
 class TaskQueue:
@@ -116,6 +168,9 @@ class TaskQueue:
                 test_client = redis.Redis(connection_pool=_redis_pool)
                 test_client.ping()
                 logger.info(f"Redis connection pool created successfully with authentication")
+                if not getattr(redis.utils, 'HIREDIS_AVAILABLE', False):
+                    # redis-py picks the C parser automatically when hiredis is installed
+                    logger.warning("hiredis not installed, Redis replies use the pure-Python parser")
                 
             except redis.exceptions.AuthenticationError as e:
                 logger.error(f"Redis authentication failed: {e}. REDIS_PASSWORD={'set' if REDIS_PASSWORD else 'NOT set'}")
@@ -149,6 +204,26 @@ class TaskQueue:
         Returns:
             Task ID or None if failed
         """
+        return self.enqueue_tasks_bulk([{
+            'tenant_id': tenant_id,
+            'task_type': task_type,
+            'payload': payload,
+            'max_retries': max_retries
+        }])[0]
+    
+    def enqueue_tasks_bulk(self, items: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        Enqueue many tasks with pipelined XADDs (one round trip per chunk)
+        
+        Args:
+            items: Dicts with tenant_id, task_type, payload and optional max_retries
+            
+        Returns:
+            Task IDs in the order of items; None for each task that failed
+        """
+        if not items:
+            return []
+        
         # Try to get Redis client if not available (retry connection)
         if not self.redis_client:
             logger.warning("Redis client not available, attempting to reconnect...")
@@ -157,61 +232,103 @@ class TaskQueue:
                 logger.info("Redis client reconnected successfully")
             else:
                 logger.error("Redis not available, cannot enqueue task")
-                return None
+                return [None] * len(items)
         
-        try:
-            task_id = str(uuid.uuid4())
-            task = Task(
-                id=task_id,
-                tenant_id=tenant_id,
-                task_type=task_type,
-                payload=payload,
-                max_retries=max_retries
-            )
-            
-            # Add to Redis Stream
-            message = asdict(task)
-            # Serialize payload - ensure all values are JSON-serializable
+        task_ids: List[Optional[str]] = [None] * len(items)
+        pending = []  # (index, task_id, message)
+        # One timestamp for the whole batch instead of one per Task
+        now_iso = datetime.utcnow().isoformat()
+        for i, item in enumerate(items):
             try:
-                # Clean None values from payload before serialization
-                cleaned_payload = self._clean_none_values(payload)
-                # Pre-serialize to catch any JSON errors early
-                payload_json = json.dumps(cleaned_payload, default=str)  # Use default=str for non-serializable types
-                message['payload'] = payload_json
-            except (TypeError, ValueError) as e:
-                logger.error(f"Failed to serialize payload: {e}. Payload keys: {list(payload.keys())}")
-                # Try to serialize each key individually to identify the problem
-                for key, value in payload.items():
-                    try:
-                        json.dumps(value, default=str)
-                    except (TypeError, ValueError) as ve:
-                        logger.error(f"Key '{key}' is not JSON-serializable: {ve}. Type: {type(value)}")
-                raise
-            
-            # Clean None values from message dict for Redis (Redis doesn't accept None)
-            cleaned_message = self._clean_none_values(message)
-            
-            self.redis_client.xadd(
-                self.stream_name,
-                cleaned_message,
-                id='*'  # Auto-generate ID
-            )
-            
-            logger.info(f"Task enqueued: {task_id} ({task_type}) for tenant {tenant_id}")
-            return task_id
+                task_id, message = self._build_message(
+                    item['tenant_id'],
+                    item['task_type'],
+                    item['payload'],
+                    item.get('max_retries', 3),
+                    created_at=now_iso
+                )
+                pending.append((i, task_id, message))
+            except Exception as e:
+                logger.error(f"Failed to enqueue task: {e}")
+        
+        for start in range(0, len(pending), ENQUEUE_PIPELINE_CHUNK):
+            chunk = pending[start:start + ENQUEUE_PIPELINE_CHUNK]
+            try:
+                with self.redis_client.pipeline(transaction=False) as pipe:
+                    for _, _, message in chunk:
+                        pipe.xadd(
+                            self.stream_name,
+                            message,
+                            id='*',  # Auto-generate ID
+                            maxlen=STREAM_MAXLEN or None,
+                            approximate=True
+                        )
+                    results = pipe.execute(raise_on_error=False)
+            except Exception as e:
+                logger.error(f"Failed to enqueue task: {e}")
+                continue
             
-        except Exception as e:
-            logger.error(f"Failed to enqueue task: {e}")
-            return None
+            for (i, task_id, message), res in zip(chunk, results):
+                if isinstance(res, Exception):
+                    logger.error(f"Failed to enqueue task: {res}")
+                    continue
+                task_ids[i] = task_id
+                logger.info(f"Task enqueued: {task_id} ({message['task_type']}) for tenant {message['tenant_id']}")
+        
+        return task_ids
+    
+    def _build_message(
+        self,
+        tenant_id: str,
+        task_type: str,
+        payload: Dict[str, Any],
+        max_retries: int,
+        created_at: Optional[str] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build the Redis Stream fields for a new task; returns (task_id, message)"""
+        task_type = sys.intern(task_type)
+        if task_type not in _VALID_TASK_TYPES and task_type not in _warned_task_types:
+            # Not rejected: consumers may define their own types, but flag typos once
+            _warned_task_types.add(task_type)
+            logger.warning(f"Enqueuing task type not registered in TaskType: {task_type}")
+        task_id = str(uuid.uuid4())
+        task = Task(
+            id=task_id,
+            tenant_id=tenant_id,
+            task_type=task_type,
+            payload=payload,
+            max_retries=max_retries,
+            created_at=created_at
+        )
+        
+        # Serialize payload - ensure all values are JSON-serializable
+        try:
+            # Clean None values from payload before serialization
+            cleaned_payload = self._clean_none_values(payload)
+            # Pre-serialize to catch any JSON errors early
+            payload_json = _json_dumps(cleaned_payload)  # Non-serializable types fall back to str()
+        except (TypeError, ValueError) as e:
+            logger.error(f"Failed to serialize payload: {e}. Payload keys: {list(payload.keys())}")
+            # Try to serialize each key individually to identify the problem
+            for key, value in payload.items():
+                try:
+                    _json_dumps(value)
+                except (TypeError, ValueError) as ve:
+                    logger.error(f"Key '{key}' is not JSON-serializable: {ve}. Type: {type(value)}")
+            raise
+        
+        message = task.to_fields()
+        message['payload'] = payload_json
+        return task_id, message
     
-    def consume_tasks(self, consumer_group: str, consumer_name: str, count: int = 10) -> List[Dict[str, Any]]:
+    def consume_tasks(self, consumer_group: str, consumer_name: str, count: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Consume tasks from stream
         
         Args:
             consumer_group: Consumer group name
             consumer_name: Consumer name (unique per worker)
-            count: Number of tasks to consume
+            count: Number of tasks to consume (default: CONSUME_COUNT)
             
         Returns:
             List of tasks
@@ -221,46 +338,100 @@ class TaskQueue:
             return []
         
         try:
-            # Create consumer group if not exists
-            try:
-                self.redis_client.xgroup_create(
-                    name=self.stream_name,
-                    groupname=consumer_group,
-                    id='0',
-                    mkstream=True
-                )
-            except redis.exceptions.ResponseError:
-                # Group already exists, that's OK
-                pass
-            
-            # Read from stream
-            messages = self.redis_client.xreadgroup(
-                groupname=consumer_group,
-                consumername=consumer_name,
-                streams={self.stream_name: '>'},
-                count=count,
-                block=1000  # Block for 1 second
-            )
-            
-            tasks = []
-            for stream, msgs in messages:
-                for msg_id, data in msgs:
-                    try:
-                        task_dict = data.copy()
-                        task_dict['id'] = msg_id
-                        # Deserialize payload
-                        if 'payload' in task_dict and isinstance(task_dict['payload'], str):
-                            task_dict['payload'] = json.loads(task_dict['payload'])
-                        tasks.append(task_dict)
-                    except Exception as e:
-                        logger.error(f"Failed to parse task: {e}")
-            
-            return tasks
-            
+            self._ensure_consumer_group(consumer_group)
+            return self._read_once(consumer_group, consumer_name, count or CONSUME_COUNT, CONSUME_BLOCK_MS)
         except Exception as e:
             logger.error(f"Failed to consume tasks: {e}")
             return []
     
+    def drain(
+        self,
+        consumer_group: str,
+        consumer_name: str,
+        count: Optional[int] = None,
+        max_reads: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        Consume tasks, reading again without blocking while batches come back full
+        
+        The first read blocks like consume_tasks; follow-up reads only happen
+        while the previous one returned `count` messages, so a backlog is
+        fetched in up to `max_reads` round trips instead of one poll cycle each.
+        
+        Args:
+            consumer_group: Consumer group name
+            consumer_name: Consumer name (unique per worker)
+            count: Number of tasks per read (default: CONSUME_COUNT)
+            max_reads: Upper bound on reads per call
+            
+        Returns:
+            List of tasks
+        """
+        if not self.redis_client:
+            logger.error("Redis not available, cannot consume tasks")
+            return []
+        
+        count = count or CONSUME_COUNT
+        tasks: List[Dict[str, Any]] = []
+        try:
+            self._ensure_consumer_group(consumer_group)
+            # block=None omits BLOCK entirely (BLOCK 0 would wait forever)
+            block_ms = CONSUME_BLOCK_MS
+            for _ in range(max_reads):
+                batch = self._read_once(consumer_group, consumer_name, count, block_ms)
+                tasks.extend(batch)
+                if len(batch) < count:
+                    break
+                block_ms = None
+        except Exception as e:
+            logger.error(f"Failed to consume tasks: {e}")
+        return tasks
+    
+    def _ensure_consumer_group(self, consumer_group: str):
+        """Create consumer group if not exists"""
+        try:
+            self.redis_client.xgroup_create(
+                name=self.stream_name,
+                groupname=consumer_group,
+                id='0',
+                mkstream=True
+            )
+        except redis.exceptions.ResponseError:
+            # Group already exists, that's OK
+            pass
+    
+    def _read_once(
+        self,
+        consumer_group: str,
+        consumer_name: str,
+        count: int,
+        block_ms: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """Single XREADGROUP call; returns parsed tasks (raises on Redis errors)"""
+        messages = self.redis_client.xreadgroup(
+            groupname=consumer_group,
+            consumername=consumer_name,
+            streams={self.stream_name: '>'},
+            count=count,
+            block=block_ms
+        )
+        
+        tasks = []
+        for stream, msgs in messages:
+            for msg_id, data in msgs:
+                try:
+                    # redis-py builds a fresh dict per entry, so fill it in place
+                    data['id'] = msg_id
+                    # Deserialize payload
+                    payload = data.get('payload')
+                    if isinstance(payload, str):
+                        data['payload'] = _json_loads(payload)
+                    tasks.append(data)
+                except Exception as e:
+                    logger.error(f"Failed to parse task: {e}")
+        
+        return tasks
+    
     def acknowledge_task(self, consumer_group: str, task_id: str) -> bool:
         """
         Acknowledge task completion
@@ -282,6 +453,26 @@ class TaskQueue:
             logger.error(f"Failed to acknowledge task: {e}")
             return False
     
+    def acknowledge_tasks(self, consumer_group: str, task_ids: List[str]) -> int:
+        """
+        Acknowledge many tasks with a single variadic XACK
+        
+        Args:
+            consumer_group: Consumer group name
+            task_ids: Task IDs from stream
+            
+        Returns:
+            Number of entries acknowledged
+        """
+        if not self.redis_client or not task_ids:
+            return 0
+        
+        try:
+            return self.redis_client.xack(self.stream_name, consumer_group, *task_ids)
+        except Exception as e:
+            logger.error(f"Failed to acknowledge tasks: {e}")
+            return 0
+    
     def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """
         Get task status
@@ -294,18 +485,27 @@ class TaskQueue:
         Returns:
             Task status info
         """
-        if not self.redis_client:
-            return None
+        return self.get_task_statuses([task_id])[0]
+    
+    def get_task_statuses(self, task_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Get the status of many tasks with a single MGET
+        
+        Args:
+            task_ids: Task IDs
+            
+        Returns:
+            Task status info in the order of task_ids; None where unknown
+        """
+        if not self.redis_client or not task_ids:
+            return [None] * len(task_ids)
         
         try:
-            status_key = f"task:status:{task_id}"
-            data = self.redis_client.get(status_key)
-            if data:
-                return json.loads(data)
-            return None
+            raw = self.redis_client.mget([f"task:status:{task_id}" for task_id in task_ids])
+            return [_json_loads(data) if data else None for data in raw]
         except Exception as e:
             logger.error(f"Failed to get task status: {e}")
-            return None
+            return [None] * len(task_ids)
     
     def update_task_status(
         self,
@@ -326,28 +526,44 @@ class TaskQueue:
         Returns:
             True if updated
         """
+        return self.update_task_statuses([(task_id, status, error_message, result)])
+    
+    def update_task_statuses(
+        self,
+        updates: List[Tuple[str, str, Optional[str], Optional[Dict[str, Any]]]]
+    ) -> bool:
+        """
+        Update many task statuses with pipelined SETEX (one round trip)
+        
+        Args:
+            updates: (task_id, status, error_message, result) tuples
+            
+        Returns:
+            True if all were updated
+        """
         if not self.redis_client:
             return False
+        if not updates:
+            return True
         
         try:
-            status_key = f"task:status:{task_id}"
-            status_data = {
-                'task_id': task_id,
-                'status': status,
-                'updated_at': datetime.utcnow().isoformat()
-            }
-            
-            if error_message:
-                status_data['error_message'] = error_message
-            if result:
-                status_data['result'] = result
-            
-            # Store with 1 hour TTL
-            self.redis_client.setex(
-                status_key,
-                3600,
-                json.dumps(status_data)
-            )
+            updated_at = datetime.utcnow().isoformat()
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                for task_id, status, error_message, result in updates:
+                    status_data = {
+                        'task_id': task_id,
+                        'status': status,
+                        'updated_at': updated_at
+                    }
+                    
+                    if error_message:
+                        status_data['error_message'] = error_message
+                    if result:
+                        status_data['result'] = result
+                    
+                    # Store with 1 hour TTL
+                    pipe.setex(f"task:status:{task_id}", 3600, _json_dumps(status_data))
+                pipe.execute()
             return True
         except Exception as e:
             logger.error(f"Failed to update task status: {e}")
@@ -355,7 +571,8 @@ class TaskQueue:
 
 
 # Global task queue instances
-_queues = {}
+_queues: Dict[str, TaskQueue] = {}
+_queues_lock = threading.Lock()
 
 def get_task_queue(queue_name: str = 'default') -> TaskQueue:
     """
@@ -367,9 +584,14 @@ def get_task_queue(queue_name: str = 'default') -> TaskQueue:
     Returns:
         TaskQueue instance
     """
-    if queue_name not in _queues:
-        _queues[queue_name] = TaskQueue(stream_name=f'tasks:{queue_name}')
-    return _queues[queue_name]
+    queue = _queues.get(queue_name)
+    if queue is None:
+        # Lock only on first use so concurrent callers don't each build a client
+        with _queues_lock:
+            queue = _queues.get(queue_name)
+            if queue is None:
+                queue = _queues[queue_name] = TaskQueue(stream_name=f'tasks:{queue_name}')
+    return queue
 
 
 def enqueue_task(
@@ -407,5 +629,15 @@ class TaskType:
     REPORT_GENERATION = 'report_generation'
     NOTIFICATION = 'notification'
     ALERT_EVALUATION = 'alert_evaluation'
+    RISK_EVALUATION = 'risk_evaluation'
+    FORCE_EVALUATE = 'force_evaluate'
+    PMTILES_GENERATION = 'pmtiles_generation'
     CUSTOM = 'custom'
 
+
+_VALID_TASK_TYPES = frozenset(
+    sys.intern(v) for k, v in vars(TaskType).items()
+    if not k.startswith('_') and isinstance(v, str)
+)
+_warned_task_types = set()
+
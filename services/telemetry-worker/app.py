@@ -3,6 +3,7 @@ import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from telemetry_worker.config import Settings
 from telemetry_worker.event_sink import PostgreSQLSink
@@ -39,6 +40,7 @@ async def lifespan(app: FastAPI):
 
     # ProfileService gets the same pool for async DB queries
     profile_service = ProfileService(settings, pool=sink._pool)
+    await profile_service.check_redis()
 
     # Wire dependencies into notification handler
     init_handler(settings, profile_service, sink)
@@ -68,6 +70,7 @@ async def lifespan(app: FastAPI):
 
     # Shutdown: cancel periodic task and close pool
     periodic_task.cancel()
+    await profile_service.close()
     await sink.stop()
     logger.info("Telemetry Worker shut down.")
 
@@ -76,6 +79,7 @@ app = FastAPI(
     title="Nekazari Telemetry Worker",
     version="2.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.include_router(health.health_router)
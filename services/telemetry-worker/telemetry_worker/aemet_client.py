@@ -9,10 +9,13 @@ import threading
 import time
 from typing import Any, Dict, Optional
 
-import requests
+import httpx
 
 logger = logging.getLogger(__name__)
 
+# Cache miss sentinel (None is a valid cached payload)
+_MISS = object()
+
 
 class AemetClient:
     def __init__(
@@ -30,7 +33,14 @@ class AemetClient:
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
         self.cache_seconds = cache_seconds
-        self.session = requests.Session()
+        # HTTP/2 lets the API call and the follow-up datos download share one
+        # multiplexed connection; requests followed redirects by default
+        self.session = httpx.Client(
+            http2=True,
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
         self._cache: Dict[str, tuple[float, Any]] = {}
         self._lock = threading.Lock()
 
@@ -70,29 +80,33 @@ class AemetClient:
         cache_key = endpoint
         ttl = cache_seconds if cache_seconds is not None else self.cache_seconds
 
-        with self._lock:
-            cached = self._cache.get(cache_key)
-            if cached:
-                expires_at, data = cached
-                if time.time() < expires_at:
-                    return data
+        cached = self._cache_get(cache_key)
+        if cached is not _MISS:
+            return cached
 
         data = self._request(endpoint)
 
-        with self._lock:
-            self._cache[cache_key] = (time.time() + ttl, data)
+        self._cache_put(cache_key, data, ttl)
 
         return data
 
+    def _cache_get(self, cache_key: str) -> Any:
+        # Lock-free read: dict.get is atomic under the GIL and entries are
+        # immutable (expires_at, data) tuples replaced wholesale on write
+        cached = self._cache.get(cache_key)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+        return _MISS
+
+    def _cache_put(self, cache_key: str, data: Any, ttl: int) -> None:
+        with self._lock:
+            self._cache[cache_key] = (time.monotonic() + ttl, data)
+
     def _request(self, endpoint: str) -> Any:
         url = f"{self.base_url}{endpoint}"
         logger.debug("AEMET request: %s", url)
 
-        response = self.session.get(
-            url,
-            params={"api_key": self.api_key},
-            timeout=self.timeout,
-        )
+        response = self.session.get(url, params={"api_key": self.api_key})
         response.raise_for_status()
         payload = response.json()
 
@@ -105,7 +119,7 @@ class AemetClient:
         if not datos_url:
             raise RuntimeError(f"AEMET response missing datos URL for {endpoint}")
 
-        datos_response = self.session.get(datos_url, timeout=self.timeout)
+        datos_response = self.session.get(datos_url)
         datos_response.raise_for_status()
         content_type = datos_response.headers.get("Content-Type", "")
 
@@ -9,9 +9,15 @@ import logging
 import sys
 import os
 import time
+import weakref
+from collections import OrderedDict
 from dataclasses import dataclass
+from functools import lru_cache
 from threading import RLock
-from typing import Dict, Tuple
+from typing import Tuple
+
+import psycopg2
+import redis
 
 # Add common directory to path
 common_path = os.path.join(os.path.dirname(__file__), '..', '..', 'common')
@@ -34,12 +40,96 @@ class _CacheEntry:
     expires_at: float
 
 
-_api_key_cache: Dict[Tuple[str, str], _CacheEntry] = {}
+# Keyed by (tenant_id, raw SHA-256 digest): 32 bytes hash faster than 64 hex chars.
+# LRU-bounded so tenants cycling through many keys can't grow it forever.
+_API_KEY_CACHE_MAXSIZE = 10_000
+_api_key_cache: "OrderedDict[Tuple[str, bytes], _CacheEntry]" = OrderedDict()
 _cache_lock = RLock()
 
+# Server-side prepared lookup, prepared once per pooled connection. RLS still
+# applies per execution since policies read the tenant setting at run time.
+_KEY_EXISTS_STMT = "telemetry_api_key_exists"
+_KEY_EXISTS_PREPARE = f"""
+    PREPARE {_KEY_EXISTS_STMT}(text) AS
+    SELECT EXISTS (
+        SELECT 1
+        FROM api_keys
+        WHERE key_hash = $1
+          AND is_active = TRUE
+    )
+"""
+_KEY_EXISTS_EXECUTE = f"EXECUTE {_KEY_EXISTS_STMT}(%s)"
+_prepared_conns: "weakref.WeakSet" = weakref.WeakSet()
+
+# Cache TTL, frozen from settings on first use (settings are process-wide via
+# get_settings(); building them at import would require POSTGRES_URL to be set)
+_TTL: int | None = None
+
+# Shared L2 cache so workers don't each hit Postgres on a cold L1
+_REDIS_KEY_PREFIX = "api_key_valid"
+_REDIS_RETRY_SECONDS = 60
+_redis_client: redis.Redis | None = None
+_redis_retry_at = 0.0
+
+
+def _get_redis_client(settings: Settings) -> redis.Redis | None:
+    global _redis_client, _redis_retry_at
+    if _redis_client is None and time.monotonic() >= _redis_retry_at:
+        try:
+            client = redis.from_url(
+                settings.redis_url,
+                decode_responses=True,
+                socket_connect_timeout=1,
+                socket_timeout=1,
+            )
+            client.ping()
+            _redis_client = client
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Redis unavailable for API key cache, using DB only: %s", exc)
+            _redis_retry_at = time.monotonic() + _REDIS_RETRY_SECONDS
+    return _redis_client
+
 
-def _compute_hash(api_key: str) -> str:
-    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+@lru_cache(maxsize=4096)
+def _compute_hash(api_key: str) -> bytes:
+    return hashlib.sha256(api_key.encode("utf-8")).digest()
+
+
+def _restore_session(conn, cursor, tenant_id: str) -> None:
+    # A failed statement aborts the transaction, and the tenant context may be
+    # transaction-local, so roll back and set it again before continuing
+    conn.rollback()
+    cursor.execute("SELECT set_current_tenant(%s)", (tenant_id,))
+
+
+def _api_key_exists(conn, tenant_id: str, key_hash: str) -> bool:
+    cursor = conn.cursor()
+    try:
+        if conn not in _prepared_conns:
+            try:
+                cursor.execute(_KEY_EXISTS_PREPARE)
+            except psycopg2.errors.DuplicatePreparedStatement:
+                # Already prepared in this session; just use it
+                _restore_session(conn, cursor, tenant_id)
+            _prepared_conns.add(conn)
+        try:
+            cursor.execute(_KEY_EXISTS_EXECUTE, (key_hash,))
+        except psycopg2.errors.InvalidSqlStatementName:
+            # Statement gone (e.g. session reset); prepare again and retry once
+            _prepared_conns.discard(conn)
+            _restore_session(conn, cursor, tenant_id)
+            cursor.execute(_KEY_EXISTS_PREPARE)
+            _prepared_conns.add(conn)
+            cursor.execute(_KEY_EXISTS_EXECUTE, (key_hash,))
+        return bool(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+
+
+def _freeze_ttl(settings: Settings) -> int:
+    global _TTL
+    _TTL = max(settings.api_key_cache_seconds, 0)
+    return _TTL
 
 
 def validate_api_key(tenant_id: str, api_key: str, settings: Settings) -> bool:
@@ -50,44 +140,61 @@ def validate_api_key(tenant_id: str, api_key: str, settings: Settings) -> bool:
         logger.warning("Missing tenant or API key during validation")
         return False
 
-    api_key_hash = _compute_hash(api_key)
-    cache_key = (tenant_id, api_key_hash)
+    api_key_digest = _compute_hash(api_key)
+    cache_key = (tenant_id, api_key_digest)
     now = time.monotonic()
-    ttl = max(settings.api_key_cache_seconds, 0)
+    ttl = _TTL
+    if ttl is None:
+        ttl = _freeze_ttl(settings)
 
     if ttl:
         with _cache_lock:
             cached = _api_key_cache.get(cache_key)
             if cached and cached.expires_at > now:
+                _api_key_cache.move_to_end(cache_key)
                 return cached.valid
 
-    try:
-        with get_db_connection_with_tenant(tenant_id) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT 1
-                FROM api_keys
-                WHERE key_hash = %s
-                  AND is_active = TRUE
-                LIMIT 1
-                """,
-                (api_key_hash,),
+    key_hash = api_key_digest.hex()
+    redis_client = _get_redis_client(settings) if ttl else None
+    redis_key = f"{_REDIS_KEY_PREFIX}:{tenant_id}:{key_hash}"
+    valid = None
+    # DB failures are answered with False but never cached, locally or shared
+    cacheable = True
+
+    if redis_client:
+        try:
+            shared = redis_client.get(redis_key)
+            if shared is not None:
+                valid = shared == "1"
+        except redis.RedisError as exc:
+            logger.debug("API key L2 cache read failed: %s", exc)
+
+    if valid is None:
+        try:
+            with get_db_connection_with_tenant(tenant_id) as conn:
+                valid = _api_key_exists(conn, tenant_id, key_hash)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception(
+                "Failed to validate API key for tenant=%s: %s",
+                tenant_id,
+                exc,
             )
-            row = cursor.fetchone()
-            valid = row is not None
-    except Exception as exc:  # noqa: BLE001
-        logger.exception(
-            "Failed to validate API key for tenant=%s: %s",
-            tenant_id,
-            exc,
-        )
-        valid = False
+            valid = False
+            cacheable = False
+        else:
+            if redis_client:
+                try:
+                    redis_client.setex(redis_key, ttl, "1" if valid else "0")
+                except redis.RedisError as exc:
+                    logger.debug("API key L2 cache write failed: %s", exc)
 
-    if ttl:
+    if ttl and cacheable:
         expiry = now + ttl
         with _cache_lock:
             _api_key_cache[cache_key] = _CacheEntry(valid=valid, expires_at=expiry)
+            _api_key_cache.move_to_end(cache_key)
+            if len(_api_key_cache) > _API_KEY_CACHE_MAXSIZE:
+                _api_key_cache.popitem(last=False)
 
     if not valid:
         logger.warning("Rejected API key for tenant=%s", tenant_id)
@@ -109,3 +216,12 @@ def invalidate_api_key_cache(tenant_id: str | None = None) -> None:
         else:
             _api_key_cache.clear()
 
+    if _redis_client:
+        pattern = f"{_REDIS_KEY_PREFIX}:{tenant_id or '*'}:*"
+        try:
+            keys = list(_redis_client.scan_iter(match=pattern, count=500))
+            if keys:
+                _redis_client.delete(*keys)
+        except redis.RedisError as exc:
+            logger.warning("Failed to clear API key L2 cache: %s", exc)
+
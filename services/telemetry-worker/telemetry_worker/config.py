@@ -20,6 +20,8 @@ class Settings(BaseSettings):
     log_level: str = "INFO"
     orion_url: str = "http://orion-ld-service:1026"
     context_url: str = "http://api-gateway-service:5000/ngsi-ld-context.json"
+    api_key_cache_seconds: int = 300
+    pg_pool_size: int = 10
 
     model_config = {"env_prefix": "", "case_sensitive": False}
 
@@ -7,13 +7,14 @@ Future: swap in KafkaSink when scale demands it (>2000 devices).
 
 from __future__ import annotations
 
-import json
 import logging
 from abc import ABC, abstractmethod
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 import asyncpg
+import cbor2
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +29,7 @@ class TelemetryEvent:
         "entity_id",
         "entity_type",
         "payload",
+        "raw",
     )
 
     def __init__(
@@ -38,6 +40,7 @@ class TelemetryEvent:
         entity_id: str,
         entity_type: str,
         payload: Dict[str, Any],
+        raw: Optional[Dict[str, Any]] = None,
     ):
         self.tenant_id = tenant_id
         self.observed_at = observed_at
@@ -45,6 +48,7 @@ class TelemetryEvent:
         self.entity_id = entity_id
         self.entity_type = entity_type
         self.payload = payload
+        self.raw = raw
 
     def as_tuple(self) -> tuple:
         """Return values as a tuple for batch insertion."""
@@ -54,7 +58,8 @@ class TelemetryEvent:
             self.device_id,
             self.entity_id,
             self.entity_type,
-            json.dumps(self.payload),
+            orjson.dumps(self.payload).decode(),
+            cbor2.dumps(self.raw) if self.raw is not None else None,
         )
 
 
@@ -90,9 +95,9 @@ class PostgreSQLSink(EventSink):
     INSERT_SQL = """
         INSERT INTO telemetry_events (
             tenant_id, observed_at, device_id,
-            entity_id, entity_type, payload
+            entity_id, entity_type, payload, raw_cbor
         )
-        VALUES ($1, $2, $3, $4, $5, $6::jsonb)
+        VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7)
     """
 
     COLUMNS = [
@@ -102,6 +107,7 @@ class PostgreSQLSink(EventSink):
         "entity_id",
         "entity_type",
         "payload",
+        "raw_cbor",
     ]
 
     def __init__(
@@ -139,21 +145,13 @@ class PostgreSQLSink(EventSink):
             raise RuntimeError("PostgreSQLSink not started")
 
         async with self._pool.acquire() as conn:
-            await conn.execute(
-                self.INSERT_SQL,
-                event.tenant_id,
-                event.observed_at,
-                event.device_id,
-                event.entity_id,
-                event.entity_type,
-                json.dumps(event.payload),
-            )
+            await conn.execute(self.INSERT_SQL, *event.as_tuple())
 
     async def write_batch(self, events: List[TelemetryEvent]) -> None:
         """
         Persist a batch of events using copy_records_to_table for maximum throughput.
 
-        Falls back to individual inserts if COPY fails (e.g., schema mismatch).
+        Falls back to a pipelined executemany if COPY fails (e.g., schema mismatch).
         """
         if not self._pool:
             raise RuntimeError("PostgreSQLSink not started")
@@ -171,9 +169,9 @@ class PostgreSQLSink(EventSink):
                     columns=self.COLUMNS,
                 )
             except Exception as e:
-                logger.warning(f"COPY failed ({e}), falling back to individual inserts")
+                logger.warning(f"COPY failed ({e}), falling back to batched inserts")
+                # executemany pipelines all rows through one prepared statement
                 async with conn.transaction():
-                    for record in records:
-                        await conn.execute(self.INSERT_SQL, *record)
+                    await conn.executemany(self.INSERT_SQL, records)
 
         logger.debug(f"Batch persisted {len(events)} events")
@@ -7,7 +7,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Dict, List, Literal, Optional
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, field_validator
 
 
 class Measurement(BaseModel):
@@ -25,7 +25,8 @@ class TelemetryPayload(BaseModel):
     measurements: List[Measurement]
     metadata: Dict[str, str] = Field(default_factory=dict)
 
-    @validator("measurements")
+    @field_validator("measurements")
+    @classmethod
     def ensure_measurements(cls, value: List[Measurement]) -> List[Measurement]:
         if not value:
             raise ValueError("measurements must not be empty")
@@ -36,4 +37,3 @@ class TelemetryResponse(BaseModel):
     status: Literal["accepted", "queued"]
     queued: bool = False
     message: str = "accepted"
-
@@ -5,10 +5,14 @@ Receives NGSI-LD entity updates and persists to TimescaleDB
 after applying Processing Profiles (throttle, filter, delta).
 """
 
+import asyncio
 import logging
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
+import orjson
 from fastapi import APIRouter, Request, BackgroundTasks, Header
 
 from .config import Settings
@@ -24,6 +28,11 @@ _settings: Optional[Settings] = None
 _profile_service: Optional[ProfileService] = None
 _event_sink: Optional[EventSink] = None
 
+# Fingerprint of the last persisted measurements per entity, so Orion
+# re-notifications of an unchanged entity skip the Redis/DB path
+_LAST_SEEN_MAXSIZE = 10_000
+_last_seen: OrderedDict[Tuple[Optional[str], str], int] = OrderedDict()
+
 
 def init_handler(
     settings: Settings,
@@ -59,13 +68,12 @@ async def process_notification_task(
             logger.debug("Empty notification received")
             return
 
-        # Collect events for batch insert
-        events: List[TelemetryEvent] = []
-
-        for entity in entities:
-            event = await _process_entity(entity, tenant_id)
-            if event:
-                events.append(event)
+        # Decide every entity concurrently, then persist the survivors at once
+        decisions = await asyncio.gather(
+            *(_decide(entity, tenant_id) for entity in entities)
+        )
+        decisions = [decision for decision in decisions if decision]
+        events: List[TelemetryEvent] = [event for event, _, _ in decisions]
 
         # Batch persist all events from this notification
         if events and _event_sink:
@@ -76,15 +84,26 @@ async def process_notification_task(
 
             logger.info(f"Persisted {len(events)} events for tenant={tenant_id}")
 
+            # Only persisted entities count as seen; a failed write leaves the
+            # fingerprints out so Orion's retry is not dropped as a duplicate
+            for _, seen_key, fingerprint in decisions:
+                _last_seen[seen_key] = fingerprint
+                _last_seen.move_to_end(seen_key)
+            while len(_last_seen) > _LAST_SEEN_MAXSIZE:
+                _last_seen.popitem(last=False)
+
     except Exception as e:
         logger.error(f"Error processing notification: {e}", exc_info=True)
 
 
-async def _process_entity(
+async def _decide(
     entity: Dict[str, Any],
     tenant_id: Optional[str],
-) -> Optional[TelemetryEvent]:
-    """Process a single NGSI-LD entity. Returns event or None."""
+) -> Optional[Tuple[TelemetryEvent, Tuple[Optional[str], str], int]]:
+    """
+    Process a single NGSI-LD entity. Returns (event, seen_key, fingerprint)
+    or None; the caller records the fingerprint once the event is persisted.
+    """
     entity_id = entity.get("id", "")
     entity_type = entity.get("type", "")
 
@@ -102,21 +121,30 @@ async def _process_entity(
         return None
 
     # Get processing profile
-    profile = _profile_service.get_profile(
+    profile = await _profile_service.get_profile(
         device_type=entity_type,
         device_id=device_id,
         tenant_id=tenant_id,
     )
 
-    # Extract measurements from entity attributes
-    measurements = _extract_measurements(entity)
+    # Extract measurements and observedAt timestamp from entity attributes
+    measurements, observed_at = _extract_measurements(entity)
 
     if not measurements:
         logger.debug(f"No measurements in entity {entity_id}")
         return None
 
+    # Same values at the same observedAt = re-notification, nothing new to store
+    seen_key = (tenant_id, entity_id)
+    fingerprint = hash(
+        (orjson.dumps(measurements, option=orjson.OPT_SORT_KEYS), observed_at)
+    )
+    if _last_seen.get(seen_key) == fingerprint:
+        logger.debug(f"Skipping duplicate notification for {entity_id}")
+        return None
+
     # Check if should persist (throttle + delta)
-    if not _profile_service.should_persist(profile, device_id, measurements):
+    if not await _profile_service.should_persist(profile, device_id, measurements):
         logger.debug(f"Skipping persistence for {device_id} (throttle/delta)")
         return None
 
@@ -127,23 +155,19 @@ async def _process_entity(
         logger.debug(f"No attributes after filtering for {device_id}")
         return None
 
-    # Extract observedAt timestamp
-    observed_at = _extract_observed_at(entity)
-
     # Update last values cache for future delta checks
-    _profile_service.update_last_values(device_id, measurements)
+    await _profile_service.update_last_values(device_id, measurements)
 
-    return TelemetryEvent(
+    event = TelemetryEvent(
         tenant_id=tenant_id,
         observed_at=observed_at,
         device_id=device_id,
         entity_id=entity_id,
         entity_type=entity_type,
-        payload={
-            "measurements": filtered,
-            "raw": entity,
-        },
+        payload={"measurements": filtered},
+        raw=entity,
     )
+    return event, seen_key, fingerprint
 
 
 _ENTITY_METADATA_KEYS = frozenset(
@@ -175,39 +199,48 @@ _ENTITY_METADATA_KEYS = frozenset(
 )
 
 
-def _extract_measurements(entity: Dict[str, Any]) -> Dict[str, Any]:
+@lru_cache(maxsize=1024)
+def _parse_observed_at(value: str) -> datetime:
+    """Parse an NGSI-LD observedAt; batches repeat the same timestamps."""
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+def _extract_measurements(
+    entity: Dict[str, Any],
+) -> Tuple[Dict[str, Any], datetime]:
     """
-    Extract measurement values from NGSI-LD entity attributes.
+    Extract measurement values and observedAt from NGSI-LD entity attributes.
 
     Only extracts Property-type attributes with scalar values.
     Skips Relationships, GeoProperties, metadata keys, and non-scalar values.
+    observedAt comes from the first attribute (of any kind) carrying a
+    parseable one, falling back to utcnow.
     """
     measurements = {}
+    observed_at = None
 
     for key, attr in entity.items():
-        if key in _ENTITY_METADATA_KEYS:
+        if attr.__class__ is not dict:
             continue
 
-        if isinstance(attr, dict):
-            attr_type = attr.get("type")
-            if attr_type == "Property":
-                val = attr.get("value")
-                if val is not None and not isinstance(val, (dict, list)):
-                    measurements[key] = val
-            # GeoProperty and Relationship: skip (not measurements)
-
-    return measurements
-
-
-def _extract_observed_at(entity: Dict[str, Any]) -> datetime:
-    """Extract observedAt from any entity attribute, fallback to utcnow."""
-    for attr in entity.values():
-        if isinstance(attr, dict) and "observedAt" in attr:
+        if observed_at is None and "observedAt" in attr:
             try:
-                return datetime.fromisoformat(attr["observedAt"].replace("Z", "+00:00"))
+                observed_at = _parse_observed_at(attr["observedAt"])
             except ValueError:
                 pass
-    return datetime.utcnow()
+
+        if key in _ENTITY_METADATA_KEYS:
+            continue
+
+        # GeoProperty and Relationship: skip (not measurements)
+        if attr.get("type") == "Property":
+            val = attr.get("value")
+            if val is not None and not isinstance(val, (dict, list)):
+                measurements[key] = val
+
+    return measurements, observed_at or datetime.utcnow()
 
 
 @router.post("/notify")
@@ -226,7 +259,7 @@ async def receive_notification(
     Supports both NGSI-LD (NGSILD-Tenant) and NGSIv2 (Fiware-Service) tenant headers.
     """
     try:
-        body = await request.json()
+        body = orjson.loads(await request.body())
 
         # NGSI-LD uses NGSILD-Tenant header; NGSIv2 uses Fiware-Service
         tenant_id = ngsild_tenant or fiware_service
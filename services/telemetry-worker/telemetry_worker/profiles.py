@@ -7,14 +7,15 @@ Uses asyncpg pool (shared with EventSink) for database queries.
 
 from __future__ import annotations
 
-import json
 import logging
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
 
 import asyncpg
-import redis
+import orjson
+from redis import asyncio as aioredis
 
 from .config import Settings
 
@@ -28,6 +29,35 @@ DEFAULT_PROFILE_CONFIG = {
     "delta_threshold": {},
 }
 
+# Exact classes stored as last values (orjson only produces these)
+_NUMERIC_TYPES = frozenset({int, float})
+
+# Decides should_persist against the device's last-values hash in one round trip.
+# ARGV: n, throttle interval (s), now (epoch s), then n attrs, n new values and
+# n thresholds. With thresholds the delta alone decides (a missing or
+# non-numeric previous value counts as changed); otherwise only the throttle.
+_SHOULD_PERSIST_LUA = """
+local n = tonumber(ARGV[1])
+if n > 0 then
+    local old = redis.call('HMGET', KEYS[1], unpack(ARGV, 4, 3 + n))
+    for i = 1, n do
+        local prev = tonumber(old[i])
+        if prev == nil then
+            return 1
+        end
+        if math.abs(tonumber(ARGV[3 + n + i]) - prev) >= tonumber(ARGV[3 + 2 * n + i]) then
+            return 1
+        end
+    end
+    return 0
+end
+local last = tonumber(redis.call('HGET', KEYS[1], 'last_save'))
+if last ~= nil and tonumber(ARGV[3]) - last < tonumber(ARGV[2]) then
+    return 0
+end
+return 1
+"""
+
 
 @dataclass
 class ProcessingProfile:
@@ -38,13 +68,31 @@ class ProcessingProfile:
     device_id: Optional[str] = None
     tenant_id: Optional[str] = None
 
+    # Derived from config once, read on every notification
+    _sampling_mode: str = field(init=False, repr=False, compare=False)
+    _sampling_interval: int = field(init=False, repr=False, compare=False)
+    _active_set: Optional[FrozenSet[str]] = field(init=False, repr=False, compare=False)
+    _ignore_set: FrozenSet[str] = field(init=False, repr=False, compare=False)
+    _delta_items: Tuple[Tuple[str, float], ...] = field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        sampling = self.config.get("sampling_rate") or {}
+        self._sampling_mode = sampling.get("mode", "all")
+        self._sampling_interval = sampling.get("interval_seconds", 0)
+        active = self.config.get("active_attributes")
+        self._active_set = frozenset(active) if active is not None else None
+        self._ignore_set = frozenset(self.config.get("ignore_attributes") or ())
+        self._delta_items = tuple((self.config.get("delta_threshold") or {}).items())
+
     @property
     def sampling_mode(self) -> str:
-        return self.config.get("sampling_rate", {}).get("mode", "all")
+        return self._sampling_mode
 
     @property
     def sampling_interval(self) -> int:
-        return self.config.get("sampling_rate", {}).get("interval_seconds", 0)
+        return self._sampling_interval
 
     @property
     def active_attributes(self) -> Optional[List[str]]:
@@ -74,11 +122,17 @@ class ProfileService:
     CACHE_TTL = 300  # 5 minutes
     CACHE_PREFIX = "processing_profile:"
     LAST_VALUE_PREFIX = "telemetry_last:"
+    LAST_VALUE_TTL = 3600
+    LOCAL_CACHE_TTL = 60  # in-process layer in front of Redis (max staleness)
+    LOCAL_CACHE_MAXSIZE = 4096
+    INVALIDATE_BATCH = 500
 
     def __init__(self, settings: Settings, pool: Optional[asyncpg.Pool] = None):
         self.settings = settings
         self._pool = pool
-        self._redis: Optional[redis.Redis] = None
+        self._redis: Optional[aioredis.Redis] = None
+        self._should_persist_script = None
+        self._local: OrderedDict[tuple, tuple[float, ProcessingProfile]] = OrderedDict()
         self._init_redis()
 
     def set_pool(self, pool: asyncpg.Pool) -> None:
@@ -86,41 +140,65 @@ class ProfileService:
         self._pool = pool
 
     def _init_redis(self) -> None:
-        """Initialize Redis connection."""
+        """Create the asyncio Redis client (connections are opened lazily)."""
         try:
-            self._redis = redis.from_url(
+            self._redis = aioredis.from_url(
                 self.settings.redis_url,
                 decode_responses=True,
             )
-            self._redis.ping()
+            self._should_persist_script = self._redis.register_script(
+                _SHOULD_PERSIST_LUA
+            )
+        except Exception as e:
+            logger.warning(f"Redis connection failed, using DB-only mode: {e}")
+            self._redis = None
+
+    async def check_redis(self) -> None:
+        """Ping Redis once at startup; fall back to DB-only mode if unreachable."""
+        if not self._redis:
+            return
+        try:
+            await self._redis.ping()
             logger.info("ProfileService connected to Redis")
         except Exception as e:
             logger.warning(f"Redis connection failed, using DB-only mode: {e}")
             self._redis = None
 
-    def get_profile(
+    async def close(self) -> None:
+        if self._redis:
+            await self._redis.aclose()
+
+    async def get_profile(
         self,
         device_type: str,
         device_id: Optional[str] = None,
         tenant_id: Optional[str] = None,
     ) -> ProcessingProfile:
         """
-        Get processing profile for a device (sync, uses Redis cache).
+        Get processing profile for a device (Redis cache only, no DB).
 
         Falls back to default if DB is unavailable.
         """
+        local_key = (device_type, device_id, tenant_id)
+        local = self._get_local(local_key)
+        if local:
+            return local
+
         # Try cache first
-        cached = self._get_from_cache(device_type, device_id, tenant_id)
+        cached = await self._get_from_cache(device_type, device_id, tenant_id)
         if cached:
+            self._put_local(local_key, cached)
             return cached
 
         # Return default (async DB load happens via get_profile_async)
-        return ProcessingProfile(
+        profile = ProcessingProfile(
             device_type=device_type,
             device_id=device_id,
             tenant_id=tenant_id,
             config=DEFAULT_PROFILE_CONFIG.copy(),
         )
+        self._put_local(local_key, profile)
+        return profile
 
     async def get_profile_async(
         self,
@@ -131,19 +209,39 @@ class ProfileService:
         """
         Get processing profile with async DB fallback.
         """
+        local_key = (device_type, device_id, tenant_id)
+        local = self._get_local(local_key)
+        if local:
+            return local
+
         # Try cache first
-        cached = self._get_from_cache(device_type, device_id, tenant_id)
+        cached = await self._get_from_cache(device_type, device_id, tenant_id)
         if cached:
+            self._put_local(local_key, cached)
             return cached
 
         # Load from database using async pool
         profile = await self._load_from_db(device_type, device_id, tenant_id)
 
         # Cache the result
-        self._cache_profile(profile)
+        await self._cache_profile(profile)
 
         return profile
 
+    def _get_local(self, key: tuple) -> Optional[ProcessingProfile]:
+        """In-process TTL/LRU lookup (no Redis round trip)."""
+        entry = self._local.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._local.move_to_end(key)
+            return entry[1]
+        return None
+
+    def _put_local(self, key: tuple, profile: ProcessingProfile) -> None:
+        self._local[key] = (time.monotonic() + self.LOCAL_CACHE_TTL, profile)
+        self._local.move_to_end(key)
+        if len(self._local) > self.LOCAL_CACHE_MAXSIZE:
+            self._local.popitem(last=False)
+
     def _get_cache_key(
         self,
         device_type: str,
@@ -158,7 +256,7 @@ class ProfileService:
             parts.append(tenant_id)
         return ":".join(parts)
 
-    def _get_from_cache(
+    async def _get_from_cache(
         self,
         device_type: str,
         device_id: Optional[str],
@@ -170,9 +268,9 @@ class ProfileService:
 
         try:
             key = self._get_cache_key(device_type, device_id, tenant_id)
-            data = self._redis.get(key)
+            data = await self._redis.get(key)
             if data:
-                config = json.loads(data)
+                config = orjson.loads(data)
                 return ProcessingProfile(
                     device_type=device_type,
                     device_id=device_id,
@@ -184,8 +282,11 @@ class ProfileService:
 
         return None
 
-    def _cache_profile(self, profile: ProcessingProfile) -> None:
-        """Cache profile in Redis."""
+    async def _cache_profile(self, profile: ProcessingProfile) -> None:
+        """Cache profile in Redis (and the in-process layer)."""
+        self._put_local(
+            (profile.device_type, profile.device_id, profile.tenant_id), profile
+        )
         if not self._redis:
             return
 
@@ -195,10 +296,10 @@ class ProfileService:
                 profile.device_id,
                 profile.tenant_id,
             )
-            self._redis.setex(
+            await self._redis.setex(
                 key,
                 self.CACHE_TTL,
-                json.dumps(profile.config),
+                orjson.dumps(profile.config),
             )
         except Exception as e:
             logger.debug(f"Failed to cache profile: {e}")
@@ -242,13 +343,13 @@ class ProfileService:
                 )
 
             if row:
-                config = row["config"]
+                dt, did, tid, config = row
                 if isinstance(config, str):
-                    config = json.loads(config)
+                    config = orjson.loads(config)
                 return ProcessingProfile(
-                    device_type=row["device_type"],
-                    device_id=row["device_id"],
-                    tenant_id=row["tenant_id"],
+                    device_type=dt,
+                    device_id=did,
+                    tenant_id=tid,
                     config=config if isinstance(config, dict) else {},
                 )
 
@@ -267,7 +368,7 @@ class ProfileService:
     # Throttling & Delta Logic
     # =========================================================================
 
-    def should_persist(
+    async def should_persist(
         self,
         profile: ProcessingProfile,
         device_id: str,
@@ -281,82 +382,52 @@ class ProfileService:
         2. Delta threshold (value change)
         """
         # Mode "all" = always persist
-        if profile.sampling_mode == "all":
+        mode = profile._sampling_mode
+        if mode == "all":
             return True
 
-        # Throttle check
-        if profile.sampling_mode == "throttle" and profile.sampling_interval > 0:
-            if not self._check_throttle(device_id, profile.sampling_interval):
-                # Check delta as fallback - if significant change, persist anyway
-                if profile.delta_thresholds:
-                    if self._check_delta(
-                        device_id, measurements, profile.delta_thresholds
-                    ):
-                        return True
-                return False
-
-        # Delta check only (no throttle)
-        if profile.delta_thresholds:
-            return self._check_delta(device_id, measurements, profile.delta_thresholds)
-
-        return True
-
-    def _check_throttle(self, device_id: str, interval_seconds: int) -> bool:
-        """Check if enough time has passed since last save."""
-        if not self._redis:
-            return True  # No cache, allow all
-
-        try:
-            key = f"{self.LAST_VALUE_PREFIX}{device_id}:last_save"
-            last_save = self._redis.get(key)
-
-            if last_save:
-                last_time = datetime.fromisoformat(last_save)
-                if datetime.utcnow() - last_time < timedelta(seconds=interval_seconds):
-                    return False
-
-            return True
-        except Exception:
+        interval = profile._sampling_interval
+        throttled = mode == "throttle" and interval > 0
+        thresholds = profile._delta_items
+        if not throttled and not thresholds:
             return True
 
-    def _check_delta(
-        self,
-        device_id: str,
-        measurements: Dict[str, Any],
-        thresholds: Dict[str, float],
-    ) -> bool:
-        """Check if any measurement exceeds its delta threshold."""
         if not self._redis:
             return True  # No cache, allow all
 
-        try:
-            for attr, threshold in thresholds.items():
-                if attr not in measurements:
-                    continue
-
-                new_value = measurements[attr]
-                if not isinstance(new_value, (int, float)):
-                    continue
-
-                key = f"{self.LAST_VALUE_PREFIX}{device_id}:{attr}"
-                old_value = self._redis.get(key)
-
-                if old_value is not None:
-                    try:
-                        old_val = float(old_value)
-                        if abs(new_value - old_val) >= threshold:
-                            return True
-                    except ValueError:
-                        return True
-                else:
-                    # No previous value, should persist
-                    return True
-
+        attrs: List[str] = []
+        new_values: List[float] = []
+        limits: List[Any] = []
+        for attr, threshold in thresholds:
+            value = measurements.get(attr)
+            if isinstance(value, (int, float)):
+                attrs.append(attr)
+                new_values.append(float(value))
+                limits.append(threshold)
+
+        # Delta decides whenever thresholds are configured; none of them
+        # present in this update means nothing changed enough
+        if thresholds and not attrs:
             return False
+
+        try:
+            return bool(
+                await self._should_persist_script(
+                    keys=[f"{self.LAST_VALUE_PREFIX}{device_id}"],
+                    args=[
+                        len(attrs),
+                        interval if throttled else 0,
+                        time.time(),
+                        *attrs,
+                        *new_values,
+                        *limits,
+                    ],
+                )
+            )
         except Exception:
             return True
 
-    def update_last_values(
+    async def update_last_values(
         self,
         device_id: str,
         measurements: Dict[str, Any],
@@ -366,19 +437,20 @@ class ProfileService:
             return
 
         try:
+            # Numeric values only; exact class match also skips bools so they
+            # never count as a comparable previous value
+            values: Dict[str, float] = {
+                attr: value
+                for attr, value in measurements.items()
+                if value.__class__ in _NUMERIC_TYPES
+            }
+            values["last_save"] = time.time()
+
+            key = f"{self.LAST_VALUE_PREFIX}{device_id}"
             pipe = self._redis.pipeline()
-
-            # Update last save time
-            save_key = f"{self.LAST_VALUE_PREFIX}{device_id}:last_save"
-            pipe.setex(save_key, 3600, datetime.utcnow().isoformat())
-
-            # Update attribute values
-            for attr, value in measurements.items():
-                if isinstance(value, (int, float)):
-                    key = f"{self.LAST_VALUE_PREFIX}{device_id}:{attr}"
-                    pipe.setex(key, 3600, str(value))
-
-            pipe.execute()
+            pipe.hset(key, mapping=values)
+            pipe.expire(key, self.LAST_VALUE_TTL)
+            await pipe.execute()
         except Exception as e:
             logger.debug(f"Failed to update last values: {e}")
 
@@ -388,27 +460,31 @@ class ProfileService:
         measurements: Dict[str, Any],
     ) -> Dict[str, Any]:
         """Filter measurements based on active/ignore attributes."""
-        result = {}
-
-        active = profile.active_attributes
-        ignore = set(profile.ignore_attributes)
-
-        for key, value in measurements.items():
-            if key in ignore:
-                continue
-            if active is not None and key not in active:
-                continue
-            result[key] = value
-
-        return result
-
-    def invalidate_cache(
+        active = profile._active_set
+        ignore = profile._ignore_set
+        if active is None and not ignore:
+            # Nothing to filter: hand back the same dict, no copy
+            return measurements
+
+        return {
+            key: value
+            for key, value in measurements.items()
+            if key not in ignore and (active is None or key in active)
+        }
+
+    async def invalidate_cache(
         self,
         device_type: Optional[str] = None,
         device_id: Optional[str] = None,
         tenant_id: Optional[str] = None,
     ) -> None:
         """Invalidate cached profiles (call after updating profiles)."""
+        if device_type:
+            for key in [k for k in self._local if k[0] == device_type]:
+                del self._local[key]
+        else:
+            self._local.clear()
+
         if not self._redis:
             return
 
@@ -417,9 +493,20 @@ class ProfileService:
             if device_type:
                 pattern = f"{self.CACHE_PREFIX}{device_type}*"
 
-            keys = self._redis.keys(pattern)
-            if keys:
-                self._redis.delete(*keys)
-                logger.info(f"Invalidated {len(keys)} cached profiles")
+            # SCAN instead of KEYS so Redis is never blocked on a full keyspace
+            # walk; UNLINK frees the values on a background thread
+            removed = 0
+            batch: List[str] = []
+            async for key in self._redis.scan_iter(
+                match=pattern, count=self.INVALIDATE_BATCH
+            ):
+                batch.append(key)
+                if len(batch) >= self.INVALIDATE_BATCH:
+                    removed += await self._redis.unlink(*batch)
+                    batch.clear()
+            if batch:
+                removed += await self._redis.unlink(*batch)
+            if removed:
+                logger.info(f"Invalidated {removed} cached profiles")
         except Exception as e:
             logger.warning(f"Failed to invalidate cache: {e}")
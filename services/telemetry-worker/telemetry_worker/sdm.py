@@ -13,10 +13,14 @@ import os
 import logging
 import json
 import hashlib
+import threading
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import psycopg2
-from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import requests
 import redis
 
@@ -28,6 +32,83 @@ logger = logging.getLogger(__name__)
 # Redis client for API key caching
 _redis_client: Optional[redis.Redis] = None
 
+# psycopg2 pools keyed by DSN (telemetry DB and activation_codes_db)
+_pg_pools: Dict[str, ThreadedConnectionPool] = {}
+_pg_pools_lock = threading.Lock()
+
+
+def _get_pg_pool(dsn: str, settings: Settings) -> ThreadedConnectionPool:
+    pool = _pg_pools.get(dsn)
+    if pool is None:
+        with _pg_pools_lock:
+            pool = _pg_pools.get(dsn)
+            if pool is None:
+                pool = _pg_pools[dsn] = ThreadedConnectionPool(
+                    minconn=2,
+                    maxconn=settings.pg_pool_size,
+                    dsn=dsn,
+                )
+    return pool
+
+
+@contextmanager
+def pg_conn(dsn: str, settings: Settings) -> Iterator[Any]:
+    """Borrow a pooled connection; rolled back on error, always returned."""
+    pool = _get_pg_pool(dsn, settings)
+    conn = pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+# telemetry_events INSERT, prepared once per pooled connection so Postgres
+# skips parse/plan on every event (parameter types inferred from the columns)
+_EVENT_INSERT_STMT = "telemetry_event_ins"
+_EVENT_INSERT_PREPARE = f"""
+    PREPARE {_EVENT_INSERT_STMT} AS
+    INSERT INTO telemetry_events (
+        tenant_id, observed_at, sensor_id, device_id, profile_code, payload
+    )
+    VALUES ($1, $2, $3, $4, $5, $6)
+"""
+_EVENT_INSERT_EXECUTE = f"EXECUTE {_EVENT_INSERT_STMT} (%s, %s, %s, %s, %s, %s)"
+_prepared_conns: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def _execute_event_insert(conn, cur, params: tuple) -> None:
+    # Only the sensor lookup precedes this in the transaction, so rolling
+    # back after a failed statement loses nothing before the retry
+    if conn not in _prepared_conns:
+        try:
+            cur.execute(_EVENT_INSERT_PREPARE)
+        except psycopg2.errors.DuplicatePreparedStatement:
+            # Session already holds it (e.g. connection outlived the WeakSet entry)
+            conn.rollback()
+        _prepared_conns.add(conn)
+    try:
+        cur.execute(_EVENT_INSERT_EXECUTE, params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # Statement gone (e.g. session reset); prepare again and retry once
+        conn.rollback()
+        cur.execute(_EVENT_INSERT_PREPARE)
+        cur.execute(_EVENT_INSERT_EXECUTE, params)
+
+
+def _activation_codes_dsn(settings: Settings) -> str:
+    """API keys live in activation_codes_db; swap the database name in the DSN."""
+    postgres_url = settings.postgres_url
+    if 'activation_codes_db' not in postgres_url:
+        if '@' in postgres_url and '/' in postgres_url:
+            parts = postgres_url.split('/')
+            base_url = '/'.join(parts[:-1])
+            postgres_url = f"{base_url}/activation_codes_db"
+    return postgres_url
+
 
 def get_redis_client(settings: Settings) -> redis.Redis:
     """Get or create Redis client for caching"""
@@ -105,28 +186,17 @@ async def _resolve_tenant_from_api_key(api_key: str, settings: Settings) -> str
     key_hash = hashlib.sha256(api_key.encode()).hexdigest()
     
     try:
-        # Try activation_codes_db first (where API keys are stored)
-        postgres_url = settings.postgres_url
-        # Extract connection details
-        if 'activation_codes_db' not in postgres_url:
-            # Try to connect to activation_codes_db
-            # Replace database name in connection string
-            if '@' in postgres_url and '/' in postgres_url:
-                parts = postgres_url.split('/')
-                base_url = '/'.join(parts[:-1])
-                postgres_url = f"{base_url}/activation_codes_db"
-        
-        conn = psycopg2.connect(postgres_url)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("""
-            SELECT tenant_id FROM api_keys
-            WHERE key_hash = %s AND is_active = true
-        """, (key_hash,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-        
-        return row['tenant_id'] if row else None
+        # API keys are stored in activation_codes_db
+        with pg_conn(_activation_codes_dsn(settings), settings) as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT tenant_id FROM api_keys
+                WHERE key_hash = %s AND is_active = true
+            """, (key_hash,))
+            row = cur.fetchone()
+            cur.close()
+        
+        return row[0] if row else None
     except Exception as e:
         logger.error(f"Error resolving tenant from API key: {e}")
         return None
@@ -135,23 +205,23 @@ async def _resolve_tenant_from_api_key(api_key: str, settings: Settings) -> str
 async def _get_sensor_profile_mapping(profile_code: str, tenant_id: str, settings: Settings) -> Dict[str, Any] | None:
     """Get sensor profile mapping from database"""
     try:
-        conn = psycopg2.connect(settings.postgres_url)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("""
-            SELECT sdm_entity_type, mapping
-            FROM sensor_profiles
-            WHERE code = %s AND (tenant_id IS NULL OR tenant_id = %s)
-            ORDER BY tenant_id NULLS LAST
-            LIMIT 1
-        """, (profile_code, tenant_id))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
+        with pg_conn(settings.postgres_url, settings) as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT sdm_entity_type, mapping
+                FROM sensor_profiles
+                WHERE code = %s AND (tenant_id IS NULL OR tenant_id = %s)
+                ORDER BY tenant_id NULLS LAST
+                LIMIT 1
+            """, (profile_code, tenant_id))
+            row = cur.fetchone()
+            cur.close()
         
         if row:
+            sdm_entity_type, mapping = row
             return {
-                'sdm_entity_type': row['sdm_entity_type'],
-                'mapping': row['mapping'] if isinstance(row['mapping'], dict) else {}
+                'sdm_entity_type': sdm_entity_type,
+                'mapping': mapping if isinstance(mapping, dict) else {}
             }
         return None
     except Exception as e:
@@ -238,69 +308,60 @@ async def _persist_telemetry_event(
 ) -> None:
     """Persist telemetry event to telemetry_events table"""
     try:
-        conn = psycopg2.connect(settings.postgres_url)
-        cur = conn.cursor()
-        
-        # Get sensor_id from sensors table
-        sensor_id = None
-        cur.execute("""
-            SELECT id FROM sensors
-            WHERE tenant_id = %s AND external_id = %s
-            LIMIT 1
-        """, (tenant_id, payload.deviceId))
-        row = cur.fetchone()
-        if row:
-            sensor_id = row[0]
-        
-        # Get latest observedAt
-        latest_observed_at = datetime.utcnow()
-        for measurement in payload.measurements:
-            if measurement.observedAt:
-                if measurement.observedAt > latest_observed_at:
-                    latest_observed_at = measurement.observedAt
-        
-        # Build payload JSON
-        payload_json = {
-            'deviceId': payload.deviceId,
-            'profile': payload.profile,
-            'measurements': [
-                {
-                    'type': m.type,
-                    'value': m.value,
-                    'unit': m.unit,
-                    'observedAt': m.observedAt.isoformat() if m.observedAt else None
-                }
-                for m in payload.measurements
-            ],
-            'metadata': payload.metadata
-        }
-        
-        # Insert into telemetry_events
-        cur.execute("""
-            INSERT INTO telemetry_events (
-                tenant_id, observed_at, sensor_id, device_id, profile_code, payload
-            )
-            VALUES (%s, %s, %s, %s, %s, %s::jsonb)
-        """, (
-            tenant_id,
-            latest_observed_at,
-            sensor_id,
-            payload.deviceId,
-            payload.profile,
-            json.dumps(payload_json)
-        ))
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+        with pg_conn(settings.postgres_url, settings) as conn:
+            cur = conn.cursor()
+            
+            # Get sensor_id from sensors table
+            sensor_id = None
+            cur.execute("""
+                SELECT id FROM sensors
+                WHERE tenant_id = %s AND external_id = %s
+                LIMIT 1
+            """, (tenant_id, payload.deviceId))
+            row = cur.fetchone()
+            if row:
+                sensor_id = row[0]
+            
+            # Get latest observedAt
+            latest_observed_at = datetime.utcnow()
+            for measurement in payload.measurements:
+                if measurement.observedAt:
+                    if measurement.observedAt > latest_observed_at:
+                        latest_observed_at = measurement.observedAt
+            
+            # Build payload JSON
+            payload_json = {
+                'deviceId': payload.deviceId,
+                'profile': payload.profile,
+                'measurements': [
+                    {
+                        'type': m.type,
+                        'value': m.value,
+                        'unit': m.unit,
+                        'observedAt': m.observedAt.isoformat() if m.observedAt else None
+                    }
+                    for m in payload.measurements
+                ],
+                'metadata': payload.metadata
+            }
+            
+            # Insert into telemetry_events
+            _execute_event_insert(conn, cur, (
+                tenant_id,
+                latest_observed_at,
+                sensor_id,
+                payload.deviceId,
+                payload.profile,
+                json.dumps(payload_json)
+            ))
+            
+            conn.commit()
+            cur.close()
         
         logger.info(f"Persisted telemetry event for device {payload.deviceId}")
         
     except Exception as e:
         logger.error(f"Error persisting telemetry event: {e}")
-        if 'conn' in locals():
-            conn.rollback()
-            conn.close()
 
 
 # =============================================================================
@@ -409,24 +470,16 @@ def _resolve_tenant_cached(api_key: str, settings: Settings) -> Optional[str]:
     
     # Query database
     try:
-        postgres_url = settings.postgres_url
-        if 'activation_codes_db' not in postgres_url:
-            if '@' in postgres_url and '/' in postgres_url:
-                parts = postgres_url.split('/')
-                base_url = '/'.join(parts[:-1])
-                postgres_url = f"{base_url}/activation_codes_db"
-        
-        conn = psycopg2.connect(postgres_url)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("""
-            SELECT tenant_id FROM api_keys
-            WHERE key_hash = %s AND is_active = true
-        """, (key_hash,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-        
-        tenant_id = row['tenant_id'] if row else None
+        with pg_conn(_activation_codes_dsn(settings), settings) as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT tenant_id FROM api_keys
+                WHERE key_hash = %s AND is_active = true
+            """, (key_hash,))
+            row = cur.fetchone()
+            cur.close()
+        
+        tenant_id = row[0] if row else None
         
         # Cache result for 5 minutes
         if tenant_id:
@@ -445,23 +498,23 @@ def _resolve_tenant_cached(api_key: str, settings: Settings) -> Optional[str]:
 def _get_sensor_profile_sync(profile_code: str, tenant_id: str, settings: Settings) -> Optional[Dict[str, Any]]:
     """Synchronous version of profile lookup"""
     try:
-        conn = psycopg2.connect(settings.postgres_url)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("""
-            SELECT sdm_entity_type, mapping
-            FROM sensor_profiles
-            WHERE code = %s AND (tenant_id IS NULL OR tenant_id = %s)
-            ORDER BY tenant_id NULLS LAST
-            LIMIT 1
-        """, (profile_code, tenant_id))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
+        with pg_conn(settings.postgres_url, settings) as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT sdm_entity_type, mapping
+                FROM sensor_profiles
+                WHERE code = %s AND (tenant_id IS NULL OR tenant_id = %s)
+                ORDER BY tenant_id NULLS LAST
+                LIMIT 1
+            """, (profile_code, tenant_id))
+            row = cur.fetchone()
+            cur.close()
         
         if row:
+            sdm_entity_type, mapping = row
             return {
-                'sdm_entity_type': row['sdm_entity_type'],
-                'mapping': row['mapping'] if isinstance(row['mapping'], dict) else {}
+                'sdm_entity_type': sdm_entity_type,
+                'mapping': mapping if isinstance(mapping, dict) else {}
             }
         return None
     except Exception as e:
@@ -504,9 +557,6 @@ def _persist_to_timescaledb(
     This bypasses Orion for historical storage, reducing Context Broker load.
     """
     try:
-        conn = psycopg2.connect(settings.postgres_url)
-        cur = conn.cursor()
-        
         # Prepare batch insert for telemetry hypertable
         rows = []
         for measurement in payload.measurements:
@@ -524,27 +574,21 @@ def _persist_to_timescaledb(
         
         # Batch insert using execute_values
         if rows:
-            execute_values(cur, """
-                INSERT INTO telemetry (
-                    time, tenant_id, entity_id, device_id, 
-                    metric_name, value_numeric, value_text, unit
-                )
-                VALUES %s
-                ON CONFLICT DO NOTHING
-            """, rows)
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+            with pg_conn(settings.postgres_url, settings) as conn:
+                cur = conn.cursor()
+                execute_values(cur, """
+                    INSERT INTO telemetry (
+                        time, tenant_id, entity_id, device_id, 
+                        metric_name, value_numeric, value_text, unit
+                    )
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
+                """, rows)
+                conn.commit()
+                cur.close()
         
     except Exception as e:
         logger.error(f"Error persisting to TimescaleDB: {e}")
-        if 'conn' in locals():
-            try:
-                conn.rollback()
-                conn.close()
-            except:
-                pass
 
 
 # =============================================================================
@@ -749,29 +793,22 @@ def _batch_insert_timescaledb(rows: List[tuple], settings: Settings) -> None:
         return
     
     try:
-        conn = psycopg2.connect(settings.postgres_url)
-        cur = conn.cursor()
-        
-        execute_values(cur, """
-            INSERT INTO telemetry (
-                time, tenant_id, entity_id, device_id,
-                metric_name, value_numeric, value_text, unit
-            )
-            VALUES %s
-            ON CONFLICT DO NOTHING
-        """, rows)
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+        with pg_conn(settings.postgres_url, settings) as conn:
+            cur = conn.cursor()
+            
+            execute_values(cur, """
+                INSERT INTO telemetry (
+                    time, tenant_id, entity_id, device_id,
+                    metric_name, value_numeric, value_text, unit
+                )
+                VALUES %s
+                ON CONFLICT DO NOTHING
+            """, rows)
+            
+            conn.commit()
+            cur.close()
         
         logger.debug(f"Batch inserted {len(rows)} telemetry rows to TimescaleDB")
         
     except Exception as e:
         logger.error(f"Error in batch TimescaleDB insert: {e}")
-        if 'conn' in locals():
-            try:
-                conn.rollback()
-                conn.close()
-            except:
-                pass
@@ -67,6 +67,7 @@ class SensorIngestWorker:
         self._stop_event = threading.Event()
         self._thread: Optional[threading.Thread] = None
         self._pending_acks: List[str] = []  # Stream IDs to acknowledge after batch flush
+        self._pending_processing: List[str] = []  # Task UUIDs to mark "processing" per consumed batch
 
     def start(self) -> None:
         if self._thread and self._thread.is_alive():
@@ -122,6 +123,7 @@ class SensorIngestWorker:
 
                 for task in tasks:
                     self._process_task(task)
+                self._mark_processing()
                 
                 # Check if batch is ready after processing
                 if self.batch_mode and self._batch and self._batch.is_ready():
@@ -139,21 +141,30 @@ class SensorIngestWorker:
         try:
             success, errors = self._batch.flush()
             
-            # Acknowledge all pending stream IDs
-            for stream_id in self._pending_acks:
-                try:
-                    self.queue.acknowledge_task(self.consumer_group, stream_id)
-                except Exception as e:
-                    logger.warning(f"Failed to ack stream_id={stream_id}: {e}")
+            # Acknowledge all pending stream IDs in one XACK
+            acked = self.queue.acknowledge_tasks(self.consumer_group, self._pending_acks)
+            if acked < len(self._pending_acks):
+                logger.warning(
+                    f"Acked {acked} of {len(self._pending_acks)} pending stream IDs"
+                )
             
             logger.info(
-                f"Batch flushed: {success} success, {errors} errors, {len(self._pending_acks)} acked"
+                f"Batch flushed: {success} success, {errors} errors, {acked} acked"
             )
         except Exception as e:
             logger.error(f"Error flushing batch: {e}")
         finally:
             self._pending_acks = []
 
+    def _mark_processing(self) -> None:
+        """Write the "processing" status of all batched tasks in one pipeline"""
+        if not self._pending_processing:
+            return
+        self.queue.update_task_statuses(
+            [(task_uuid, "processing", None, None) for task_uuid in self._pending_processing]
+        )
+        self._pending_processing = []
+
     def _process_task(self, task: Dict[str, Any]) -> None:
         task_type = task.get("task_type")
         if task_type != TaskType.SENSOR_INGEST:
@@ -177,10 +188,7 @@ class SensorIngestWorker:
             self._pending_acks.append(stream_id)
             
             if task_uuid:
-                self.queue.update_task_status(
-                    task_uuid,
-                    status="processing",
-                )
+                self._pending_processing.append(task_uuid)
             
             logger.debug(
                 "Added to batch: stream_id=%s (batch size=%d)",